@@ -1,63 +1,180 @@
 #!/usr/bin/env python3
 """
 Diagnostic script to debug K9 Jets price extraction.
-Fetches a single flight detail page and shows exactly what's being matched.
+Fetches a handful of flight detail pages concurrently and shows exactly
+what's being matched on each.
 """
 
+import asyncio
+import hashlib
+import html as html_module
+import json
+import os
 import re
+import time
+from collections import Counter
+
 import httpx
 
+# Compiled once at import time rather than on every call. Class-anchored
+# patterns match case-sensitively, like scraper.py's: class names are
+# case-sensitive in HTML and re.I makes every scan of the page slower.
+_BDI_RE = re.compile(
+    r'class="[^"]*woocommerce-Price-amount[^"]*"[^>]*>\s*<bdi[^>]*>(.*?)</bdi>',
+    re.S,
+)
+_DOLLAR_RE = re.compile(r'\$[\d,]+\.?\d*')
+_PRICE_CTX_RE = re.compile(r'Price:</span>\s*(.*?)</p>', re.I | re.S)
+_STOCK_RE = re.compile(r'<p[^>]*class="[^"]*stock[^"]*"[^>]*>(.*?)</p>', re.S)
+# Only real <a href> links - skips <link rel="canonical"> and URLs in scripts
+_URL_RE = re.compile(
+    r'''<a\b[^>]*?\bhref=["'](https://www\.k9jets\.com/flight/[^"']+)["']''', re.I
+)
+
+def _unescape(text: str) -> str:
+    """html.unescape, skipped for text with no entities at all."""
+    if "&" not in text:
+        return text  # Nothing to decode - the common case for K9 prices
+    return html_module.unescape(text)
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+}
+
+MAX_CONCURRENT_FETCHES = 5
+
+# Pages are re-used for CACHE_TTL seconds, then revalidated with
+# If-None-Match / If-Modified-Since so unchanged pages come back as a 304
+CACHE_DIR = ".http_cache"
+CACHE_TTL = 600
+
 def _strip_html(text: str) -> str:
-    """Remove HTML tags."""
-    return re.sub(r"<.*?>", "", text, flags=re.S).strip()
+    """Remove HTML tags with a single linear scan (no regex backtracking)."""
+    out = []
+    i = 0
+    while True:
+        lt = text.find("<", i)
+        if lt < 0:
+            out.append(text[i:])
+            break
+        gt = text.find(">", lt + 1)
+        if gt < 0:
+            # Unterminated tag: keep the remainder as-is, like the old regex did
+            out.append(text[i:])
+            break
+        out.append(text[i:lt])
+        i = gt + 1
+    return "".join(out).strip()
+
+class _PriceChars(dict):
+    """str.translate table keeping digits and '.' (same as scraper.py's)."""
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        kept = codepoint if char.isdecimal() or char == "." else None
+        self[codepoint] = kept
+        return kept
+
+_PRICE_CHARS = _PriceChars()
 
 def clean_price(price_str):
     if not price_str:
         return None
-    clean = re.sub(r'[^\d.]', '', price_str)
     try:
-        return float(clean)
-    except:
+        return float(price_str.translate(_PRICE_CHARS))
+    except ValueError:
         return None
 
-def debug_k9_page(url: str):
-    print(f"\n{'='*60}")
-    print(f"Debugging: {url}")
-    print(f"{'='*60}\n")
+def _save_html(path: str, html: str):
+    with open(path, "w") as f:
+        f.write(html)
+
+def _read_cache(body_path: str, meta_path: str) -> tuple[dict, str | None]:
+    """Cached meta for a URL, plus its body if that is still within CACHE_TTL."""
+    if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+        return {}, None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if time.time() - meta.get("fetched_at", 0) < CACHE_TTL:
+        with open(body_path, encoding="utf-8") as f:
+            return meta, f.read()
+    return meta, None
+
+
+def _read_body(body_path: str) -> str:
+    with open(body_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _write_cache(body_path: str, meta_path: str, body: str | None, meta: dict):
+    """Store meta, and the body too unless it is None (a 304 kept the old one)."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if body is not None:
+        with open(body_path, "w", encoding="utf-8") as f:
+            f.write(body)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+
+
+async def fetch_cached(client: httpx.AsyncClient, url: str) -> str:
+    """GET a page through the small on-disk cache in CACHE_DIR."""
+    key = hashlib.sha256(url.encode()).hexdigest()
+    body_path = os.path.join(CACHE_DIR, f"{key}.html")
+    meta_path = os.path.join(CACHE_DIR, f"{key}.json")
     
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
-    }
+    # Disk reads and writes go through threads so the other fetches in
+    # flight keep moving meanwhile
+    meta, body = await asyncio.to_thread(_read_cache, body_path, meta_path)
+    if body is not None:
+        return body
     
-    resp = httpx.get(url, headers=headers, timeout=30)
-    html = resp.text
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
     
-    # Save raw HTML for inspection
-    with open("debug_k9_page.html", "w") as f:
-        f.write(html)
-    print("📄 Saved full HTML to debug_k9_page.html\n")
+    resp = await client.get(url, headers=headers)
+    if resp.status_code not in (200, 304):
+        return resp.text  # Never cache error pages
+    
+    if resp.status_code == 304:
+        body = await asyncio.to_thread(_read_body, body_path)
+        new_body = None
+    else:
+        body = new_body = resp.text
+        meta = {
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+        }
+    
+    meta["fetched_at"] = time.time()
+    await asyncio.to_thread(_write_cache, body_path, meta_path, new_body, meta)
+    return body
+
+async def fetch_page(client: httpx.AsyncClient, url: str, sem: asyncio.Semaphore) -> str:
+    async with sem:
+        return await fetch_cached(client, url)
+
+def debug_k9_page(url: str, html: str):
+    print(f"\n{'='*60}")
+    print(f"Debugging: {url}")
+    print(f"{'='*60}\n")
     
     # ========== METHOD 1: BDI regex (current approach) ==========
     print("=" * 40)
     print("METHOD 1: BDI regex matches")
     print("=" * 40)
     
-    bdi_regex = re.compile(
-        r'class="[^"]*woocommerce-Price-amount[^"]*"[^>]*>\s*<bdi[^>]*>(.*?)</bdi>',
-        re.I | re.S,
-    )
-    
-    bdi_matches = bdi_regex.findall(html)
+    bdi_matches = _BDI_RE.findall(html)
     print(f"Found {len(bdi_matches)} matches:\n")
     
-    import html as html_module
     for i, match in enumerate(bdi_matches[:20]):  # Limit to first 20
         stripped = _strip_html(match)
-        unescaped = html_module.unescape(stripped)  # THE FIX!
+        unescaped = _unescape(stripped)  # THE FIX!
         price_wrong = clean_price(stripped)  # Old (buggy) way
         price_fixed = clean_price(unescaped)  # New (correct) way
         print(f"  [{i+1}] Raw: {match[:80]!r}...")
@@ -72,14 +189,11 @@ def debug_k9_page(url: str):
     print("METHOD 2: Dollar regex matches")
     print("=" * 40)
     
-    dollar_regex = re.compile(r'\$[\d,]+\.?\d*')
-    
-    dollar_matches = dollar_regex.findall(html)
-    print(f"Found {len(dollar_matches)} matches:\n")
+    # Tally straight from the match iterator - no intermediate list
+    counts = Counter(m.group() for m in _DOLLAR_RE.finditer(html))
+    print(f"Found {sum(counts.values())} matches:\n")
     
     # Show unique values and their counts
-    from collections import Counter
-    counts = Counter(dollar_matches)
     for match, count in counts.most_common(20):
         price = clean_price(match)
         print(f"  {match!r} (x{count}) -> {price}")
@@ -90,12 +204,7 @@ def debug_k9_page(url: str):
     print("=" * 40)
     
     # Find context around "Price:" text
-    price_context_regex = re.compile(
-        r'Price:</span>\s*(.*?)</p>',
-        re.I | re.S,
-    )
-    
-    context_matches = price_context_regex.findall(html)
+    context_matches = _PRICE_CTX_RE.findall(html)
     print(f"Found {len(context_matches)} 'Price:' context matches:\n")
     
     for i, match in enumerate(context_matches[:10]):
@@ -109,53 +218,53 @@ def debug_k9_page(url: str):
     print("METHOD 4: Seats/stock info")
     print("=" * 40)
     
-    stock_regex = re.compile(
-        r'<p[^>]*class="[^"]*stock[^"]*"[^>]*>(.*?)</p>',
-        re.I | re.S,
-    )
-    
-    stock_matches = stock_regex.findall(html)
+    stock_matches = _STOCK_RE.findall(html)
     print(f"Found {len(stock_matches)} stock matches:\n")
     
     for i, match in enumerate(stock_matches[:10]):
         stripped = _strip_html(match)
         print(f"  [{i+1}] {stripped!r}")
 
-if __name__ == "__main__":
-    # Grab a sample K9 flight detail URL
-    # First, let's get the routes page and find a detail link
-    
-    print("Fetching K9 routes page to find a flight detail URL...")
-    
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
-    }
+async def main():
+    # Grab a few sample K9 flight detail URLs
+    # First, let's get the routes page and find the detail links
     
-    resp = httpx.get("https://www.k9jets.com/routes/", headers=headers, timeout=30)
-    html = resp.text
+    print("Fetching K9 routes page to find flight detail URLs...")
     
-    # Find a detail URL
-    url_regex = re.compile(
-        r'href="(https://www\.k9jets\.com/flight/[^"]+)"',
-        re.I,
-    )
-    
-    urls = url_regex.findall(html)
-    unique_urls = list(dict.fromkeys(urls))[:5]  # First 5 unique
+    # One pooled client so every request to k9jets.com reuses the connection
+    async with httpx.AsyncClient(
+        headers=HEADERS,
+        timeout=30,
+        limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+    ) as client:
+        html = await fetch_cached(client, "https://www.k9jets.com/routes/")
+        
+        # Find detail URLs
+        urls = [_unescape(u) for u in _URL_RE.findall(html)]
+        unique_urls = list(dict.fromkeys(urls))[:5]  # First 5 unique
+        
+        print(f"Found {len(unique_urls)} flight detail URLs")
+        
+        if not unique_urls:
+            print("No flight URLs found!")
+            return
+        
+        sem = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        pages = await asyncio.gather(
+            *(fetch_page(client, url, sem) for url in unique_urls)
+        )
     
-    print(f"Found {len(unique_urls)} flight detail URLs")
+    # Save the first page's raw HTML for inspection
+    await asyncio.to_thread(_save_html, "debug_k9_page.html", pages[0])
+    print("📄 Saved first page's HTML to debug_k9_page.html")
     
-    if unique_urls:
-        print(f"\nAnalyzing first URL: {unique_urls[0]}\n")
-        debug_k9_page(unique_urls[0])
-    else:
-        print("No flight URLs found!")
+    # Analyse sequentially so the reports don't interleave
+    for url, page_html in zip(unique_urls, pages):
+        debug_k9_page(url, page_html)
         
     print("\n" + "=" * 60)
     print("DONE! Check debug_k9_page.html for the full page source.")
     print("=" * 60)
 
+if __name__ == "__main__":
+    asyncio.run(main())
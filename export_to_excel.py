@@ -1,5 +1,5 @@
 """
-Export Supabase flight data to Excel/CSV for analysis.
+Export Supabase flight data to Excel/CSV (plus Parquet) for analysis.
 Run: python export_to_excel.py
 """
 import os
@@ -14,59 +14,105 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Output columns, in order: joined flight details then snapshot values
+FLIGHT_FIELDS = ["competitor", "origin", "destination", "departure_date", "departure_time", "operator"]
+SNAPSHOT_FIELDS = ["price", "seats_available", "status", "scraped_at"]
+
+
+PAGE_SIZE = 1000
+
+
+def iter_snapshots(page_size=PAGE_SIZE):
+    """Yield snapshot pages (joined with flight details) newest first."""
+    offset = 0
+    # Snapshots the daily job adds mid-export land at the top of this
+    # newest-first order and push older rows into the next page, so a row
+    # can come back twice; ids already yielded are dropped
+    seen_ids = set()
+    while True:
+        response = supabase.table("flight_snapshots").select(
+            "*, flights(competitor, origin, destination, departure_date, departure_time, operator)"
+        ).order("scraped_at", desc=True).order("id").range(
+            offset, offset + page_size - 1
+        ).execute()
+        if not response.data:
+            return
+        page = [row for row in response.data if row["id"] not in seen_ids]
+        seen_ids.update(row["id"] for row in page)
+        if page:
+            yield page
+        # Advance by what actually came back - the server may cap page size
+        offset += len(response.data)
+
 
 def export_data():
     print("📊 Fetching flight data from Supabase...")
     
-    # Fetch all snapshots joined with flight details
-    response = supabase.table("flight_snapshots").select(
-        "*, flights(competitor, origin, destination, departure_date, departure_time, operator)"
-    ).order("scraped_at", desc=True).execute()
+    # Flatten the nested structure column-by-column so pandas gets flat
+    # lists instead of one dict per snapshot. Pages are consumed as they
+    # arrive, so only one page of raw JSON is held at a time.
+    columns = {name: [] for name in FLIGHT_FIELDS + SNAPSHOT_FIELDS}
+    row_count = 0
+    for page in iter_snapshots():
+        for snapshot in page:
+            flight = snapshot.get("flights") or {}
+            for name in FLIGHT_FIELDS:
+                columns[name].append(flight.get(name))
+            for name in SNAPSHOT_FIELDS:
+                columns[name].append(snapshot.get(name))
+        row_count += len(page)
     
-    if not response.data:
+    if not row_count:
         print("❌ No data found!")
         return
     
-    # Flatten the nested structure for Excel
-    rows = []
-    for snapshot in response.data:
-        flight = snapshot.get("flights", {})
-        rows.append({
-            "competitor": flight.get("competitor"),
-            "origin": flight.get("origin"),
-            "destination": flight.get("destination"),
-            "departure_date": flight.get("departure_date"),
-            "departure_time": flight.get("departure_time"),
-            "operator": flight.get("operator"),
-            "price": snapshot.get("price"),
-            "seats_available": snapshot.get("seats_available"),
-            "status": snapshot.get("status"),
-            "scraped_at": snapshot.get("scraped_at"),
-        })
-    
     # Try to use pandas for Excel, fall back to CSV
     timestamp = datetime.now().strftime("%Y%m%d_%H%M")
     
     try:
         import pandas as pd
-        df = pd.DataFrame(rows)
+        df = pd.DataFrame(columns)
+        
+        # Parquet copy for analysis: columnar + zstd, much smaller and
+        # faster to load back into pandas than the xlsx/csv
+        parquet_path = f"flight_data_{timestamp}.parquet"
+        try:
+            df.to_parquet(parquet_path, engine="pyarrow", compression="zstd", index=False)
+            print(f"✅ Exported {row_count} rows to {parquet_path}")
+        except ImportError:
+            print("💡 Tip: Install pyarrow for a Parquet copy: pip install pyarrow")
+        
+        from openpyxl import Workbook
         
-        # Export to Excel
+        # Export to Excel - write-only mode streams rows instead of keeping
+        # a styled Cell object around for every value
         excel_path = f"flight_data_{timestamp}.xlsx"
-        df.to_excel(excel_path, index=False, sheet_name="Flight Data")
-        print(f"✅ Exported {len(rows)} rows to {excel_path}")
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Flight Data")
+        ws.append(list(df.columns))
+        # NaN -> None so missing prices/seats stay blank like to_excel wrote them
+        for row in df.astype(object).where(df.notna(), None).itertuples(index=False):
+            ws.append(row)
+        wb.save(excel_path)
+        print(f"✅ Exported {row_count} rows to {excel_path}")
         
     except ImportError:
         # Fallback to CSV if pandas not installed
-        import csv
         csv_path = f"flight_data_{timestamp}.csv"
         
-        with open(csv_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-            writer.writeheader()
-            writer.writerows(rows)
+        try:
+            # Column-at-a-time C writer straight from the column lists
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+            pa_csv.write_csv(pa.table(columns), csv_path)
+        except ImportError:
+            import csv
+            with open(csv_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns.keys())
+                writer.writerows(zip(*columns.values()))
         
-        print(f"✅ Exported {len(rows)} rows to {csv_path}")
+        print(f"✅ Exported {row_count} rows to {csv_path}")
         print("💡 Tip: Install pandas + openpyxl for Excel export: pip install pandas openpyxl")
 
 
@@ -1,4 +1,6 @@
 import os
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -63,59 +65,90 @@ AIRPORT_MAPPING = {
     "Dubai, UAE": "Dubai"
 }
 
+# Same mapping with whitespace-normalized keys, built once at import
+_NORM_MAP = {k.strip(): v for k, v in AIRPORT_MAPPING.items()}
+
+@lru_cache(maxsize=1024)
+def _normalize_name(name):
+    """String-only half of normalize_airport; few distinct names, so cache it"""
+    clean_name = name.strip()
+    
+    # Reject blanks and explicit "0" strings
+    if clean_name in ('', '0'):
+        return None
+        
+    return _NORM_MAP.get(clean_name, clean_name)
+
 def normalize_airport(name):
     """Cleans up airport names using the mapping dictionary"""
     if not name or pd.isna(name):
         return None
-    
-    clean_name = str(name).strip()
-    
-    # Reject explicit "0" strings
-    if clean_name == '0':
-        return None
-        
-    return AIRPORT_MAPPING.get(clean_name, clean_name)
+    return _normalize_name(str(name))
 
-def fetch_flights():
-    """Fetches unique flight legs"""
+def normalize_airport_series(names):
+    """Vectorized normalize_airport: resolves each distinct name once, then
+    broadcasts the result back to every row via the category codes"""
+    cats = pd.Categorical(names)
+    resolved = [_normalize_name(str(raw)) for raw in cats.categories]
+    # Missing values have code -1, which lands on the trailing None
+    resolved.append(None)
+    return pd.Series(np.array(resolved, dtype=object)[cats.codes], index=names.index)
+
+PAGE_SIZE = 1000
+
+def fetch_flights(page_size=PAGE_SIZE):
+    """Fetches unique flight legs, one page at a time"""
     print("Fetching flight routes...")
-    response = supabase.table("flights").select("*").execute()
-    df = pd.DataFrame(response.data)
-    return df
+    frames = []
+    last_id = None
+    while True:
+        # Only the columns the balance sheet uses
+        query = supabase.table("flights").select("id,competitor,origin,destination")
+        # Keyset paging: each page starts after the last id seen, so rows the
+        # daily job inserts meanwhile can't shift a row into two pages the
+        # way offsets could
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = query.order("id").limit(page_size).execute()
+        if not response.data:
+            break
+        frames.append(pd.DataFrame(response.data))
+        last_id = response.data[-1]["id"]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
 
 def analyze_network_balance(df):
-    unique_flights = df.drop_duplicates(subset=['id']).copy()
+    # fetch_flights pages by primary key (keyset), so every row is already a
+    # unique leg
+    unique_flights = df.copy()
     
     # 1. CLEAN DATA (Normalize names FIRST)
-    unique_flights['origin'] = unique_flights['origin'].apply(normalize_airport)
-    unique_flights['destination'] = unique_flights['destination'].apply(normalize_airport)
+    unique_flights['origin'] = normalize_airport_series(unique_flights['origin'])
+    unique_flights['destination'] = normalize_airport_series(unique_flights['destination'])
     
     unique_flights = unique_flights.dropna(subset=['origin', 'destination'])
     
-    # 2. CALCULATE FLOWS
-    outbound = unique_flights.groupby(['competitor', 'origin']).size().reset_index(name='departures')
-    inbound = unique_flights.groupby(['competitor', 'destination']).size().reset_index(name='arrivals')
-    
-    # Merge
-    balance = pd.merge(outbound, inbound, 
-                       left_on=['competitor', 'origin'], 
-                       right_on=['competitor', 'destination'], 
-                       how='outer')
-    
-    # Coalesce Airport Name
-    balance['airport'] = balance['origin'].combine_first(balance['destination'])
-    
-    # Fill NaNs with 0 temporarily
-    balance['arrivals'] = balance['arrivals'].fillna(0)
-    balance['departures'] = balance['departures'].fillna(0)
+    # 2. STACK LEGS: one row per (competitor, airport, departure/arrival)
+    legs = pd.concat([
+        unique_flights[['competitor', 'origin']].rename(columns={'origin': 'airport'}).assign(kind='departures'),
+        unique_flights[['competitor', 'destination']].rename(columns={'destination': 'airport'}).assign(kind='arrivals'),
+    ], ignore_index=True)
     
     # 3. FILTER OUT ARTIFACTS
     invalid_entries = ["0", 0, "Los Angeles, California -> Van Nuys, California"]
-    balance = balance[~balance['airport'].isin(invalid_entries)]
-    
-    # 4. AGGREGATE AGAIN (Crucial Step for merging Paris)
-    balance = balance[['competitor', 'airport', 'arrivals', 'departures']]
-    balance = balance.groupby(['competitor', 'airport']).sum().reset_index()
+    legs = legs[~legs['airport'].isin(invalid_entries)]
+    
+    # 4. COUNT FLOWS in a single pass (names are already merged, e.g. Paris);
+    # categorical keys group on integer codes
+    legs = legs.astype({'competitor': 'category', 'airport': 'category', 'kind': 'category'})
+    balance = (
+        legs.groupby(['competitor', 'airport', 'kind'], observed=True).size()
+        .unstack('kind', fill_value=0)
+        .reindex(columns=['arrivals', 'departures'], fill_value=0)
+    )
+    balance.columns = list(balance.columns)
+    balance = balance.reset_index().astype({'competitor': object, 'airport': object})
     
     balance['net_flow'] = balance['arrivals'] - balance['departures']
     
@@ -124,6 +157,9 @@ def analyze_network_balance(df):
 def plot_balance_sheet(balance_df):
     competitors = balance_df['competitor'].unique()
     
+    # One figure reused for every competitor; cleared between charts
+    fig, ax = plt.subplots(figsize=(14, 8))
+    
     for comp in competitors:
         comp_data = balance_df[balance_df['competitor'] == comp].copy()
         
@@ -134,34 +170,39 @@ def plot_balance_sheet(balance_df):
         melted = comp_data.melt(id_vars=['airport'], value_vars=['arrivals', 'departures'], 
                                 var_name='Type', value_name='Count')
         
-        plt.figure(figsize=(14, 8)) 
+        ax.clear()
         
-        sns.barplot(data=melted, x='airport', y='Count', hue='Type', 
+        sns.barplot(data=melted, x='airport', y='Count', hue='Type', ax=ax,
                     palette={'arrivals': '#2ecc71', 'departures': '#e74c3c'})
         
-        plt.xticks(rotation=45, ha='right')
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
 
-        # Annotate
-        for i, row in enumerate(comp_data.itertuples()):
-            if row.net_flow != 0:
-                label = f"{int(row.net_flow)} Stuck" if row.net_flow > 0 else f"{abs(int(row.net_flow))} Appear"
-                color = 'red' if row.net_flow != 0 else 'gray'
-                max_val = max(row.arrivals, row.departures)
-                plt.text(i, max_val + 0.5, label, ha='center', fontsize=9, fontweight='bold', color=color)
+        # Annotate: one label per imbalanced airport, on top of its taller bar
+        net = comp_data['net_flow'].to_numpy().astype(int)
+        labels = np.where(net > 0, np.char.add(np.abs(net).astype(str), " Stuck"),
+                          np.char.add(np.abs(net).astype(str), " Appear"))
+        labels = np.where(net != 0, labels, "")
+        arrivals_taller = comp_data['arrivals'].to_numpy() >= comp_data['departures'].to_numpy()
+        arrivals_bars, departures_bars = ax.containers[:2]
+        ax.bar_label(arrivals_bars, labels=np.where(arrivals_taller, labels, ""),
+                     padding=3, fontsize=9, fontweight='bold', color='red')
+        ax.bar_label(departures_bars, labels=np.where(arrivals_taller, "", labels),
+                     padding=3, fontsize=9, fontweight='bold', color='red')
 
-        plt.title(f"{comp}: Network Balance Sheet (In vs. Out)", fontsize=16, fontweight='bold')
-        plt.xlabel("Airport", fontsize=12)
-        plt.ylabel("Number of Flights", fontsize=12)
-        plt.grid(axis='y', alpha=0.1)
-        plt.legend(title=None)
+        ax.set_title(f"{comp}: Network Balance Sheet (In vs. Out)", fontsize=16, fontweight='bold')
+        ax.set_xlabel("Airport", fontsize=12)
+        ax.set_ylabel("Number of Flights", fontsize=12)
+        ax.grid(axis='y', alpha=0.1)
+        ax.legend(title=None)
         
-        plt.tight_layout()
-        plt.subplots_adjust(bottom=0.25)
+        fig.tight_layout()
+        fig.subplots_adjust(bottom=0.25)
         
         filename = f"{comp.replace(' ', '_')}_network_balance.png"
-        plt.savefig(filename, dpi=300)
+        fig.savefig(filename, dpi=150, bbox_inches='tight')
         print(f"Generated {filename}")
-        plt.show()
+    
+    plt.close(fig)
 
 if __name__ == "__main__":
     df = fetch_flights()
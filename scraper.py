@@ -1,14 +1,19 @@
 import asyncio
 import os
 import re
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
 import html as html_lib
+from html.entities import codepoint2name
+from typing import TypedDict
 
 import httpx
 from dateutil import parser
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
-from supabase import Client, create_client
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright
+from postgrest import ReturnMethod
+from supabase import AsyncClient, acreate_client
 
 load_dotenv()
 
@@ -19,24 +24,235 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("Supabase credentials not found. Check your .env or GitHub Secrets.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# The async Supabase client is created in main(), on the running event loop
+
+# --- HTTP CLIENT ---
+# One pooled HTTP/2 client is opened in main() and shared by every HTTP
+# scraper, so requests multiplex over a few warm TLS connections. httpx
+# advertises (and transparently decodes) brotli whenever the brotli package
+# is installed, which shrinks the text-heavy K9 pages on the wire.
+K9_BASE_URL = "https://www.k9jets.com"
+K9_HEADERS = {"Referer": f"{K9_BASE_URL}/routes/"}
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+}
+# Idle connections are kept for a minute (httpx default: 5s) so the gaps
+# between the routes page, origin POSTs and detail GETs don't cost a new
+# TLS handshake
+HTTP_LIMITS = httpx.Limits(
+    max_connections=50, max_keepalive_connections=25, keepalive_expiry=60.0
+)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+
+# Concurrent K9 requests: origin filter POSTs / product page GETs in flight
+K9_ORIGIN_CONCURRENCY = 8
+K9_DETAIL_CONCURRENCY = 20
+# K9 requests (origin POSTs and product page GETs together) started per
+# second, however long each one takes
+K9_REQUEST_RATE = 5
+
+# Responses worth retrying: throttling and transient gateway errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Longest Retry-After we honour before giving up on the wait
+MAX_RETRY_AFTER = 60.0
+
+# Bark Air route pages loaded at once: plain GETs / browser pages
+BARK_HTTP_CONCURRENCY = 16
+BARK_CONCURRENCY = 6
+
+BARK_CITIES = (
+    "London", "New York", "Los Angeles", "Paris",
+    "San Francisco", "Madrid", "Seattle", "Honolulu",
+    "Lisbon", "Kailua-Kona",
+)
+BARK_COLLECTION_URL = (
+    "https://air.bark.co/collections/bookings"
+    "?filter.v.option.location={}&sort_by=created-ascending"
+)
+# Every (origin, destination, listing URL), in the order results are reported
+BARK_ROUTES = [
+    (origin, dest, BARK_COLLECTION_URL.format(f"{origin} To {dest}".replace(" ", "+")))
+    for origin in BARK_CITIES
+    for dest in BARK_CITIES
+    if origin != dest
+]
+
+# Rows per bulk Supabase request (stays well under PostgREST payload limits).
+# A run is a few thousand rows, and the chunks go out concurrently, so going
+# bigger wouldn't cut wall-clock time, only grow each request body
+BATCH_SIZE = 500
+
+# --- RECORDS ---
+class Flight(TypedDict, total=False):
+    """
+    One scraped flight, as the scrapers build it and save_to_supabase reads it.
 
-def clean_price(price_str):
+    Kept as one dict per flight rather than columns: a run is a few thousand
+    rows, and each is reshaped into a JSON object for PostgREST anyway.
+    """
+    competitor: str
+    date: str
+    route: str
+    origin: str  # Set by scrapers that know the legs; others split route
+    destination: str
+    operator: str
+    price: float | None
+    seats: int | None
+    status: str
+    departure_time: str | None  # K9 /routes/ cards only
+    url: str | None  # K9 product page, used to refine price & seats
+
+
+# --- PRECOMPILED PATTERNS ---
+# Compiled once at import; these run for every card / detail page scraped.
+# Markup patterns keyed on a class name are case-sensitive on purpose: class
+# names are case-sensitive in HTML, and dropping re.I lets the engine scan
+# the 100-250 KB K9 pages several times faster.
+# [^>]* instead of a lazy .*?: same matches, but no "is this '>'?" retry
+# after every character, which makes tag stripping ~4x faster
+_HTML_TAG_RE = re.compile(r"<[^>]*>")
+_DIGITS_RE = re.compile(r"\d+")
+_TO_RE = re.compile(r"\s+to\s+", re.I)
+_DEPARTURE_RE = re.compile(r"departure time:\s*(.+)", re.I)
+
+# K9 product (/flight/) page
+_BDI_RE = re.compile(
+    r'class="[^"]*woocommerce-Price-amount[^"]*"[^>]*>\s*<bdi[^>]*>(.*?)</bdi>',
+    re.S,
+)
+_DOLLAR_RE = re.compile(r'\$[\d,]+\.?\d*')
+_STOCK_P_RE = re.compile(r'<p[^>]*class="[^"]*stock[^"]*"[^>]*>(.*?)</p>', re.S)
+
+# K9 /routes/ flight cards. Each field keeps its own pattern: every one has
+# a literal prefix the engine can skip ahead to, and five of those searches
+# per article beat a single alternation (or a Python class-attribute scan)
+# that has to try every branch at each offset. Even a shared-prefix
+# class="[^"]*(?P<kind>title|description|stock) pattern loses: each class
+# attribute then backtracks through [^"]* trying all three names.
+_OPTION_RE = re.compile(
+    r'<option[^>]*value=["\']([^"\']+)["\'][^>]*>(.*?)</option>', re.I | re.S
+)
+# Opening tag only; the body runs to the next </article> (see _iter_articles)
+_ARTICLE_OPEN_RE = re.compile(
+    r'<article[^>]*class="[^"]*elementor-post[^"]*"[^>]*>'
+)
+_TITLE_RE = re.compile(
+    r'class="[^"]*elementor-icon-box-title[^"]*"[^>]*>(.*?)</', re.S
+)
+_ROUTE_DESC_RE = re.compile(
+    r'class="[^"]*elementor-icon-box-description[^"]*"[^>]*>(.*?)</',
+    re.S,
+)
+_STOCK_RE = re.compile(r'class="[^"]*stock[^"]*"[^>]*>(.*?)</', re.S)
+# Bark Air collection page (Shopify, rendered server-side). A card's class
+# list must contain flight_box itself, as querySelector('.flight_box') does.
+_BARK_CARD_OPEN_RE = re.compile(
+    r'<(\w+)[^>]*class="(?:[^"]*\s)?flight_box(?:\s[^"]*)?"[^>]*>'
+)
+_BARK_DATE_RE = re.compile(
+    r'<[^>]*class="[^"]*flight_details[^"]*"[^>]*>'
+)
+_DATA_FLIGHT_DATE_RE = re.compile(r'data-flight-date="([^"]*)"')
+_BARK_PRICE_RE = re.compile(
+    r'class="[^"]*price-item--regular[^"]*"[^>]*>(.*?)</', re.S
+)
+_BARK_SEATS_RE = re.compile(
+    r'class="[^"]*flight-availability-info[^"]*"[^>]*>(.*?)</', re.S
+)
+_BARK_SOLD_OUT_RE = re.compile(r'class="[^"]*sold-out-tag')
+# Unrolled form of (.*?)</p>: runs of non-"<" are consumed in one step.
+# The short title/stock captures gain nothing from this, so they stay lazy.
+_HEADING_P_RE = re.compile(
+    r'<p[^>]*class="[^"]*elementor-heading-title[^"]*"[^>]*>'
+    r'([^<]*(?:<(?!/p>)[^<]*)*)</p>'
+)
+# Detail URL (book / waitlist button)
+_URL_RE = re.compile(
+    r'<a[^>]*class="[^"]*elementor-button[^"]*"[^>]*href="([^"]+/flight/[^"]+)"',
+    re.S,
+)
+
+
+class _PriceChars(dict):
+    """str.translate table keeping digits and '.'; filled lazily per char."""
+
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        # isdecimal() is exactly what \d matches in a str regex
+        kept = codepoint if char.isdecimal() or char == "." else None
+        self[codepoint] = kept
+        return kept
+
+
+_PRICE_CHARS = _PriceChars()
+
+
+@lru_cache(maxsize=32)
+def _select_regex(select_name: str) -> re.Pattern:
+    """Compiled <select name="..."> pattern, built once per select name."""
+    return re.compile(
+        rf'<select[^>]*name=["\']{re.escape(select_name)}["\'][^>]*>(.*?)</select>',
+        re.I | re.S,
+    )
+
+@lru_cache(maxsize=32)
+def _tag_regex(tag: str) -> re.Pattern:
+    """Compiled open-or-close pattern for one tag name (group 1 is "/" on a close)."""
+    return re.compile(rf"<(/?){tag}\b")
+
+def clean_price(price_str: str | None) -> float | None:
     if not price_str: return None
-    clean = re.sub(r'[^\d.]', '', price_str)
+    # translate() drops the currency symbol / commas in one C-level pass.
+    # No plain float() attempt first: every scraped price carries a "$" or
+    # a comma, so it would only ever fail and cost a raised ValueError.
     try:
-        return float(clean)
-    except:
+        return float(price_str.translate(_PRICE_CHARS))
+    except ValueError:
         return None
 
-def clean_seats(seats_str):
+def clean_seats(seats_str: str | None) -> int:
     if not seats_str: return 0
-    numbers = re.findall(r'\d+', seats_str)
-    if numbers:
-        return int(numbers[0])
-    return 0
+    # Only the first number counts, so search() stops once it is found
+    # where findall()[0] would collect every number in the string
+    match = _DIGITS_RE.search(seats_str)
+    return int(match.group()) if match else 0
+
+
+# Dash / arrow separators, in priority order, tried when there is no " to "
+_ROUTE_SEPARATORS = (" - ", " – ", " — ", "->", "→")
+
+
+def _separator_regex(sep: str) -> re.Pattern:
+    """Match `sep` whether its characters are literal or HTML entities.
+
+    K9 route text is stored as served (it is part of the flights key), so
+    "Paris &#8211; Nice" has to split just like "Paris – Nice".
+    """
+    parts = []
+    for ch in sep:
+        forms = [re.escape(ch), f"&#0*{ord(ch)};", f"&#[xX]0*{ord(ch):x};"]
+        if ord(ch) in codepoint2name:
+            forms.append(f"&{codepoint2name[ord(ch)]};")
+        parts.append("(?:%s)" % "|".join(forms))
+    return re.compile("".join(parts), re.IGNORECASE)
+
+
+_ROUTE_SEPARATOR_RES = tuple(_separator_regex(sep) for sep in _ROUTE_SEPARATORS)
+
+
+def _has_route_separator(route_str: str) -> bool:
+    """True if split_route would split this string (it names both ends)."""
+    return _TO_RE.search(route_str) is not None or any(
+        sep_re.search(route_str) for sep_re in _ROUTE_SEPARATOR_RES
+    )
 
 
+@lru_cache(maxsize=4096)
 def split_route(route_str: str) -> tuple[str, str]:
     """
     Split a human‑readable route string into (origin, destination).
@@ -48,6 +264,8 @@ def split_route(route_str: str) -> tuple[str, str]:
 
     If we can't confidently split, we return (route_str, route_str) so you can
     see the raw value and adjust the parser later.
+
+    Cached: the same few hundred routes repeat across every date scraped.
     """
     if not route_str:
         return "", ""
@@ -55,15 +273,17 @@ def split_route(route_str: str) -> tuple[str, str]:
     txt = route_str.strip()
 
     # Try explicit " to " first (e.g. "Teterboro, New Jersey to Dubai, UAE")
-    if re.search(r"\s+to\s+", txt, flags=re.IGNORECASE):
-        parts = re.split(r"\s+to\s+", txt, maxsplit=1, flags=re.IGNORECASE)
-        if len(parts) == 2:
-            return parts[0].strip(), parts[1].strip()
+    parts = _TO_RE.split(txt, maxsplit=1)
+    if len(parts) == 2:
+        return parts[0].strip(), parts[1].strip()
 
     # Then try common dash / arrow separators
-    for sep in [" - ", " – ", " — ", "->", "→"]:
-        if sep in txt:
-            parts = [p.strip() for p in txt.split(sep) if p.strip()]
+    for sep_re in _ROUTE_SEPARATOR_RES:
+        if sep_re.search(txt):
+            # A full split() rather than partition(): multi-stop routes keep
+            # their first and last stop, and empty pieces are skipped. The
+            # cache means it runs once per distinct route, not per row.
+            parts = [p for p in map(str.strip, sep_re.split(txt)) if p]
             if len(parts) >= 2:
                 # Use first part as origin, last part as final destination
                 return parts[0], parts[-1]
@@ -72,7 +292,71 @@ def split_route(route_str: str) -> tuple[str, str]:
     return txt, txt
 
 
-async def _fetch_k9_detail_page(client: httpx.AsyncClient, url: str, max_retries: int = 3) -> dict:
+class _RateLimiter:
+    """Spaces acquire() calls at least 1/rate seconds apart, across all tasks."""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        now = asyncio.get_running_loop().time()
+        # Claim the next free slot before sleeping, so waiters queue in order
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying `resp`: its Retry-After, else 2s, 4s, 6s."""
+    retry_after = resp.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+        try:
+            # The other allowed form is an HTTP date
+            when = parsedate_to_datetime(retry_after)
+            wait = (when - datetime.now(timezone.utc)).total_seconds()
+            return min(max(wait, 0.0), MAX_RETRY_AFTER)
+        except (TypeError, ValueError):
+            pass
+    return (attempt + 1) * 2
+
+
+async def _send_with_retry(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    max_retries: int = 3,
+    limiter: _RateLimiter | None = None,
+    **kwargs,
+) -> httpx.Response:
+    """
+    client.request() that retries RETRY_STATUSES with backoff, honouring
+    Retry-After. Raises httpx.HTTPStatusError for any other error status,
+    or once the retries are used up. With a `limiter`, every attempt -
+    retries included - takes a slot from it first.
+    """
+    for attempt in range(max_retries):
+        if limiter is not None:
+            await limiter.acquire()
+        resp = await client.request(method, url, **kwargs)
+        if resp.status_code in RETRY_STATUSES and attempt < max_retries - 1:
+            await asyncio.sleep(_retry_delay(resp, attempt))
+            continue
+        resp.raise_for_status()
+        return resp
+
+
+async def _fetch_k9_detail_page(
+    client: httpx.AsyncClient,
+    url: str,
+    max_retries: int = 3,
+    limiter: _RateLimiter | None = None,
+) -> dict:
     """
     Fetch a single K9 product /flight/ page and extract authoritative price
     and seats/status using the markup you provided.
@@ -82,76 +366,58 @@ async def _fetch_k9_detail_page(client: httpx.AsyncClient, url: str, max_retries
         <bdi><span class="woocommerce-Price-currencySymbol">$</span>7,925.00</bdi>
       </span>
     
-    Includes retry logic for 502/503 server errors.
+    Retries 429 throttling and 502/503 server errors (see _send_with_retry).
     """
-    for attempt in range(max_retries):
-        try:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            break  # Success - exit retry loop
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code in (502, 503) and attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 2  # 2s, 4s, 6s
-                await asyncio.sleep(wait_time)
-                continue
-            print(f"      ⚠️ Failed to fetch detail page {url}: {e}")
-            return {}
-        except Exception as e:
-            print(f"      ⚠️ Failed to fetch detail page {url}: {e}")
-            return {}
+    try:
+        resp = await _send_with_retry(
+            client, "GET", url,
+            max_retries=max_retries, limiter=limiter, headers=K9_HEADERS,
+        )
+    except Exception as e:
+        print(f"      ⚠️ Failed to fetch detail page {url}: {e}")
+        return {}
 
-    html_text = resp.text
+    # Regex work on a 100-250 KB page; run it off the event loop so the other
+    # in-flight requests keep moving meanwhile
+    return await asyncio.to_thread(_parse_k9_detail, resp.text)
 
-    # Approach 1: Extract content inside <bdi> tags within woocommerce-Price-amount
-    # This captures "$7,925.00" as the full text content
-    bdi_regex = re.compile(
-        r'class="[^"]*woocommerce-Price-amount[^"]*"[^>]*>\s*<bdi[^>]*>(.*?)</bdi>',
-        re.I | re.S,
-    )
-
-    # Approach 2 (fallback): Find all dollar amounts directly in the text
-    # Matches patterns like $7,925.00 or $36.00
-    dollar_regex = re.compile(r'\$[\d,]+\.?\d*')
 
+def _parse_k9_detail(html_text: str) -> dict:
+    """Extract price and seats/status from a K9 /flight/ page's HTML."""
+    # Highest plausible price seen so far (None until one clears the fee cut-off)
     price_value: float | None = None
-    candidates: list[float] = []
 
-    # Try the structured approach first
-    for bdi_match in bdi_regex.findall(html_text):
-        raw_price = _strip_html(bdi_match)
-        # CRITICAL: Unescape HTML entities like &#036; -> $ before parsing
+    # Approach 1: Extract content inside <bdi> tags within woocommerce-Price-amount
+    # This captures "$7,925.00" as the full text content
+    for bdi_match in _BDI_RE.finditer(html_text):
+        # CRITICAL: _strip_html also unescapes entities like &#036; -> $
         # Otherwise "&#036;8,925.00" becomes "0368925" when non-digits are stripped
-        raw_price = html_lib.unescape(raw_price)
+        raw_price = _strip_html(bdi_match.group(1))
         val = clean_price(raw_price)
         if val is not None and val > 100:  # Filter out small fees
-            candidates.append(val)
+            if price_value is None or val > price_value:
+                price_value = val
 
-    # If no luck, try direct dollar amount extraction
-    if not candidates:
-        for dollar_match in dollar_regex.findall(html_text):
-            val = clean_price(dollar_match)
+    # Approach 2 (fallback): Find all dollar amounts directly in the text
+    # Matches patterns like $7,925.00 or $36.00
+    if price_value is None:
+        for dollar_match in _DOLLAR_RE.finditer(html_text):
+            val = clean_price(dollar_match.group())
             if val is not None and val > 100:  # Filter out small fees like $36
-                candidates.append(val)
-
-    if candidates:
-        price_value = max(candidates)
+                if price_value is None or val > price_value:
+                    price_value = val
 
     # Seats / status: <p class="stock in-stock">6 Seats Available</p>
-    seats_p_regex = re.compile(
-        r'<p[^>]*class="[^"]*stock[^"]*"[^>]*>(.*?)</p>', re.I | re.S
-    )
-    seats_match = seats_p_regex.search(html_text)
+    seats_match = _STOCK_P_RE.search(html_text)
     seats_text = _strip_html(seats_match.group(1)) if seats_match else ""
 
-    seats_value = clean_seats(seats_text) if seats_text else None
-    seats_lower = seats_text.lower()
-    if "sold out" in seats_lower:
+    # Sold out is checked first: its count is discarded, so don't parse it
+    if "sold out" in seats_text.lower():
         status = "Sold Out"
         seats_value = None
-    elif seats_value is not None and seats_value > 0:
-        status = "Available"
     else:
         status = "Available"
+        seats_value = clean_seats(seats_text) if seats_text else None
 
     out: dict = {}
     if price_value is not None:
@@ -161,70 +427,116 @@ async def _fetch_k9_detail_page(client: httpx.AsyncClient, url: str, max_retries
     return out
 
 
-def _strip_html(text: str) -> str:
-    """Very small helper to remove HTML tags."""
-    return re.sub(r"<.*?>", "", text, flags=re.S).strip()
+def _strip_html(text: str, unescape: bool = True) -> str:
+    """Very small helper to remove HTML tags and (by default) decode entities."""
+    # Most extracted cells are already plain text; skip the regex for those
+    if "<" in text:
+        text = _HTML_TAG_RE.sub("", text)
+    if unescape and "&" in text:
+        text = html_lib.unescape(text)
+    return text.strip()
 
 
 def _extract_select_options(html: str, select_name: str) -> list[dict]:
     """Parse <select name="..."> options from raw HTML without extra deps."""
-    select_regex = re.compile(
-        rf'<select[^>]*name=["\']{re.escape(select_name)}["\'][^>]*>(.*?)</select>',
-        re.I | re.S,
-    )
-    match = select_regex.search(html)
+    match = _select_regex(select_name).search(html)
     if not match:
         return []
 
     inner = match.group(1)
-    option_regex = re.compile(
-        r'<option[^>]*value=["\']([^"\']+)["\'][^>]*>(.*?)</option>', re.I | re.S
-    )
-
     options: list[dict] = []
-    for value, label in option_regex.findall(inner):
-        label_clean = _strip_html(label)
+    for value, label in _OPTION_RE.findall(inner):
+        # Not unescaped: origin labels end up in flights.origin, a key column
+        label_clean = _strip_html(label, unescape=False)
         value_clean = value.strip()
         if value_clean:
             options.append({"value": value_clean, "label": label_clean})
     return options
 
 
-def _extract_k9_flights_from_html(html: str) -> list[dict]:
-    """Parse K9 flight cards from routes HTML using regex-based extraction."""
-    flights: list[dict] = []
+def _iter_articles(html: str):
+    """Yield the body of each <article class="...elementor-post..."> card.
 
-    # Grab each <article ... elementor-post ...>...</article>
-    article_regex = re.compile(
-        r'<article[^>]*class="[^"]*elementor-post[^"]*"[^>]*>(.*?)</article>',
-        re.I | re.S,
-    )
+    Same result as a lazy (.*?)</article> findall, but the body is cut out
+    with str.find instead of the regex engine testing for "</article>" at
+    every character of the page.
+    """
+    pos = 0
+    while True:
+        open_match = _ARTICLE_OPEN_RE.search(html, pos)
+        if not open_match:
+            return
+        start = open_match.end()
+        end = html.find("</article>", start)
+        if end < 0:
+            return
+        yield html[start:end]
+        pos = end + len("</article>")
+
+
+def _iter_bark_cards(html: str):
+    """Yield the body of each .flight_box card, up to its matching close tag."""
+    pos = 0
+    while True:
+        open_match = _BARK_CARD_OPEN_RE.search(html, pos)
+        if not open_match:
+            return
+        tag = open_match.group(1)
+        start = open_match.end()
+        # Cards nest same-named tags (div in div), so track the depth
+        depth = 1
+        end = -1
+        for m in _tag_regex(tag).finditer(html, start):
+            depth += -1 if m.group(1) else 1
+            if depth == 0:
+                end = m.start()
+                break
+        if end < 0:
+            return
+        yield html[start:end]
+        pos = end
 
-    title_regex = re.compile(
-        r'class="[^"]*elementor-icon-box-title[^"]*"[^>]*>(.*?)</', re.I | re.S
-    )
-    route_regex = re.compile(
-        r'class="[^"]*elementor-icon-box-description[^"]*"[^>]*>(.*?)</',
-        re.I | re.S,
-    )
-    price_regex = re.compile(
-        r'class="[^"]*woocommerce-Price-amount[^"]*"[^>]*>(.*?)</', re.I | re.S
-    )
-    seats_regex = re.compile(
-        r'class="[^"]*stock[^"]*"[^>]*>(.*?)</', re.I | re.S
-    )
-    heading_p_regex = re.compile(
-        r'<p[^>]*class="[^"]*elementor-heading-title[^"]*"[^>]*>(.*?)</p>',
-        re.I | re.S,
-    )
-    # Detail URL (book / waitlist button)
-    url_regex = re.compile(
-        r'<a[^>]*class="[^"]*elementor-button[^"]*"[^>]*href="([^"]+/flight/[^"]+)"',
-        re.I | re.S,
-    )
 
-    for article_html in article_regex.findall(html):
-        date_match = title_regex.search(article_html)
+def _extract_bark_cards_from_html(html: str) -> list[dict]:
+    """
+    Parse Bark Air cards from a collection page into the same dicts
+    JS_EXTRACT_BARK returns in the browser.
+    """
+    cards = []
+    for card_html in _iter_bark_cards(html):
+        date = None
+        header = _BARK_DATE_RE.search(card_html)
+        if header:
+            date_match = _DATA_FLIGHT_DATE_RE.search(header.group())
+            if date_match:
+                date = html_lib.unescape(date_match.group(1))
+        price_match = _BARK_PRICE_RE.search(card_html)
+        seats_match = _BARK_SEATS_RE.search(card_html)
+        cards.append(
+            {
+                "date": date,
+                "price": _strip_html(price_match.group(1)) if price_match else "0",
+                "seats": _strip_html(seats_match.group(1)) if seats_match else "0",
+                "sold_out": _BARK_SOLD_OUT_RE.search(card_html) is not None,
+            }
+        )
+    return cards
+
+
+def _extract_k9_flights_from_html(html: str) -> list[Flight]:
+    """
+    Parse K9 flight cards from routes HTML using regex-based extraction.
+
+    A card repeating an earlier (date, route) on the same page is skipped
+    before the rest of it is parsed; the caller's dedup keeps the first
+    one anyway.
+    """
+    flights: list[Flight] = []
+    seen_keys: set[tuple[str, str]] = set()
+
+    # Grab each <article ... elementor-post ...>...</article>
+    for article_html in _iter_articles(html):
+        date_match = _TITLE_RE.search(article_html)
         if not date_match:
             continue
         raw_date = _strip_html(date_match.group(1))
@@ -232,35 +544,39 @@ def _extract_k9_flights_from_html(html: str) -> list[dict]:
             continue
 
         # Route
-        route_match = route_regex.search(article_html)
+        route_match = _ROUTE_DESC_RE.search(article_html)
         raw_route = (
-            _strip_html(route_match.group(1)) if route_match else "Unknown Route"
+            # Not unescaped: the route becomes flights.origin/destination, part
+            # of the upsert key, so it stays exactly as stored by earlier runs
+            _strip_html(route_match.group(1), unescape=False)
+            if route_match
+            else "Unknown Route"
         )
+        key = (raw_date, raw_route)
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
 
         # Seats & status from stock text
-        seats_match = seats_regex.search(article_html)
+        seats_match = _STOCK_RE.search(article_html)
         seats_text = _strip_html(seats_match.group(1)) if seats_match else ""
 
-        seats_value = clean_seats(seats_text) if seats_text else None
-        seats_lower = seats_text.lower()
-        if "sold out" in seats_lower:
+        # Sold out is checked first: its count is discarded, so don't parse it
+        if "sold out" in seats_text.lower():
             status = "Sold Out"
             seats_value = None
-        elif seats_value is not None and seats_value > 0:
-            status = "Available"
         else:
-            # No explicit count and not marked sold‑out – treat as unknown/available
             status = "Available"
-            seats_value = None
-
-        # Price – leave as None here; detail page is the source of truth.
-        raw_price = None
+            seats_value = clean_seats(seats_text) if seats_text else None
+            if not seats_value:
+                # No explicit count and not marked sold‑out – treat as unknown/available
+                seats_value = None
 
         # Operator and departure time from heading <p>s
         operator_text = "Unknown"
         departure_time = None
 
-        for match in heading_p_regex.finditer(article_html):
+        for match in _HEADING_P_RE.finditer(article_html):
             heading_text = _strip_html(match.group(1))
             lower = heading_text.lower()
             if "operator:" in lower and operator_text == "Unknown":
@@ -269,13 +585,15 @@ def _extract_k9_flights_from_html(html: str) -> list[dict]:
                 operator_text = after.strip() or operator_text
             elif "departure time" in lower and departure_time is None:
                 # e.g. "Departure Time: 2:00 PM"
-                m_dep = re.search(r"departure time:\s*(.+)", heading_text, re.I)
+                m_dep = _DEPARTURE_RE.search(heading_text)
                 if m_dep:
                     departure_time = m_dep.group(1).strip()
+            if operator_text != "Unknown" and departure_time is not None:
+                break  # Both found; later headings can't change either
 
         # Detail URL (used later to refine price & seats from the product page)
         url = None
-        url_match = url_regex.search(article_html)
+        url_match = _URL_RE.search(article_html)
         if url_match:
             url = html_lib.unescape(url_match.group(1))
 
@@ -285,7 +603,8 @@ def _extract_k9_flights_from_html(html: str) -> list[dict]:
                 "date": raw_date,
                 "route": raw_route,
                 "operator": operator_text,
-                "price": clean_price(raw_price) if raw_price is not None else None,
+                # Left unset here; the detail page is the source of truth
+                "price": None,
                 "seats": seats_value,
                 "status": status,
                 "departure_time": departure_time,
@@ -295,15 +614,202 @@ def _extract_k9_flights_from_html(html: str) -> list[dict]:
 
     return flights
 
+# --- IN-BROWSER CARD EXTRACTION ---
+# Each page.evaluate is one round-trip to the browser, versus several
+# locator calls per card. Missing elements come back as the same fallbacks
+# the scrapers used before ("0" for price / seats, null otherwise), so no
+# field needs a count() check before it is read.
+JS_EXTRACT_BARK = """
+() => Array.from(document.querySelectorAll('.flight_box')).map(card => {
+    const text = (sel, fallback) => {
+        const el = card.querySelector(sel);
+        return el ? el.innerText : fallback;
+    };
+    const header = card.querySelector('.flight_details');
+    return {
+        date: header ? header.getAttribute('data-flight-date') : null,
+        price: text('.price-item--regular', '0'),
+        seats: text('.flight-availability-info', '0'),
+        sold_out: card.querySelector('.sold-out-tag') !== null,
+    };
+})
+"""
+
+# Text is trimmed (and the "Operator:" label dropped) in the browser, so the
+# (date, route) dedup keys already match the values stored on the flight
+JS_EXTRACT_K9 = """
+() => Array.from(document.querySelectorAll('article.elementor-post')).map(card => {
+    const text = (sel, fallback) => {
+        const el = card.querySelector(sel);
+        return el ? el.innerText.trim() : fallback;
+    };
+    // innerText costs a layout read, so stop at the first operator line
+    let operator = null;
+    for (const p of card.querySelectorAll('p.elementor-heading-title')) {
+        const t = p.innerText;
+        if (t.includes('Operator:')) {
+            operator = t.replaceAll('Operator:', '').trim();
+            break;
+        }
+    }
+    return {
+        date: text('.elementor-icon-box-title', null),
+        route: text('.elementor-icon-box-description', null),
+        price: text('.woocommerce-Price-amount', '0'),
+        seats: text('.stock', '0'),
+        operator,
+    };
+})
+"""
+
+# True once the listing holds more than `count` cards
+JS_K9_MORE_CARDS = """
+count => document.querySelectorAll('article.elementor-post').length > count
+"""
+
+# Returns the card count from before the scroll, like a separate count() would
+JS_SCROLL_K9 = """
+() => {
+    const count = document.querySelectorAll('article.elementor-post').length;
+    window.scrollTo(0, document.body.scrollHeight);
+    return count;
+}
+"""
+
+
+def _bark_card_to_flight(card: dict, origin: str, dest: str) -> Flight:
+    """Normalize one JS_EXTRACT_BARK row into a flight dict."""
+    return {
+        "competitor": "Bark Air",
+        "date": card["date"],
+        "route": f"{origin} -> {dest}",
+        "origin": origin,
+        "destination": dest,
+        "price": clean_price(card["price"]),
+        "seats": clean_seats(card["seats"]),
+        "status": "Sold Out" if card["sold_out"] else "Available",
+        "operator": "Gulfstream G5",
+    }
+
+
+def _bark_cards_to_flights(cards: list[dict], origin: str, dest: str) -> list[Flight]:
+    """
+    Flights for one route listing, one per date. Every card on the page
+    shares the route, so a repeated date is a duplicate save_to_supabase
+    would drop anyway; the later card wins here just as it does there.
+    """
+    latest = {card["date"]: card for card in cards if card["date"]}
+    return [_bark_card_to_flight(card, origin, dest) for card in latest.values()]
+
+
+def _k9_card_to_flight(card: dict, route_text: str) -> Flight:
+    """Normalize one JS_EXTRACT_K9 row (route already resolved) into a flight dict."""
+    operator_text = card["operator"] if card["operator"] is not None else "Unknown"
+    seats = clean_seats(card["seats"])
+    return {
+        "competitor": "K9 Jets",
+        "date": card["date"],
+        "route": route_text,
+        "operator": operator_text,
+        "price": clean_price(card["price"]),
+        "seats": seats,
+        "status": "Available" if seats > 0 else "Sold Out",
+    }
+
+# Headless Chromium in CI: no GPU, /tmp instead of the runner's small
+# /dev/shm, and images never decoded even if one slips past the route filter.
+# Playwright already passes --disable-extensions, --disable-sync and
+# --disable-background-networking itself.
+CHROMIUM_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--blink-settings=imagesEnabled=false",
+]
+
+# Requests the Playwright scrapers never read; skipping them makes each
+# navigation much lighter. Stylesheets stay: visibility checks, clicks and
+# innerText all depend on layout.
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "connect.facebook.net",
+    "segment.io",
+    "segment.com",
+    "hotjar.com",
+)
+# One anchored match on the URL's host (or a subdomain of it), instead of a
+# substring test per host that could also hit a query string
+_BLOCKED_HOST_RE = re.compile(
+    r"[a-z]+://(?:[^/?#]*\.)?(?:%s)(?::\d+)?(?:[/?#]|$)"
+    % "|".join(map(re.escape, BLOCKED_HOSTS))
+)
+
+
+async def _block_heavy_resources(route):
+    request = route.request
+    if (
+        request.resource_type in BLOCKED_RESOURCE_TYPES
+        or _BLOCKED_HOST_RE.match(request.url)
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
+
+def _is_xhr(response) -> bool:
+    return response.request.resource_type in ("xhr", "fetch")
+
+
+def _is_filter_xhr(response) -> bool:
+    """The JetSmartFilters request a K9 filter change fires, and nothing else."""
+    url = response.url
+    return _is_xhr(response) and ("admin-ajax" in url or "jet-smart-filters" in url)
+
+
+async def _run_and_wait_for_xhr(page, action, timeout_ms: int, predicate=_is_filter_xhr):
+    """
+    Await `action` (e.g. a select_option), then wait for the AJAX response it
+    triggers instead of sleeping a fixed time. `timeout_ms` is the old fixed
+    delay, so a filter that fires no request costs exactly what it did.
+    Only responses matching `predicate` count, so an unrelated request
+    (consent, cart fragments) can't end the wait early. Errors from `action`
+    itself, timeouts included, propagate. Returns whatever `action` returned.
+    """
+    action_done = False
+    try:
+        async with page.expect_response(predicate, timeout=timeout_ms) as response_info:
+            result = await action
+            action_done = True
+        await response_info.value
+    except PlaywrightTimeoutError:
+        if not action_done:
+            raise  # The action itself timed out
+        return result  # No matching request: the old fixed delay has passed
+    await page.wait_for_timeout(200)  # let the response handler update the DOM
+    return result
+
+async def _wait_for_network_idle(page, timeout_ms: int):
+    """
+    Wait until the page's requests have settled rather than sleeping; like
+    _run_and_wait_for_xhr, `timeout_ms` is the old fixed delay, so a page
+    that never goes quiet costs exactly what it did.
+    """
+    try:
+        await page.wait_for_load_state("networkidle", timeout=timeout_ms)
+    except PlaywrightTimeoutError:
+        pass
+
 async def handle_cookie_banner(page):
     """Checks for and closes the K9 cookie banner if it exists"""
     try:
         # Try multiple common selectors for the "Accept" button
         # The logs suggest a 'cmplz' (Complianz) banner
-        banner_btn = page.locator(".cmplz-accept, .cmplz-btn.cmplz-accept, #ucc-c-btn")
-        if await banner_btn.count() > 0 and await banner_btn.is_visible():
+        banner_btn = page.locator(".cmplz-accept, .cmplz-btn.cmplz-accept, #ucc-c-btn").first
+        # is_visible() is False when nothing matches, so no separate count()
+        if await banner_btn.is_visible():
             print("   🍪 Cookie banner detected. Smashing it...")
-            await banner_btn.first.click()
+            await banner_btn.click()
             await page.wait_for_timeout(1000) # Wait for animation to clear
     except Exception as e:
         # It's okay if we don't find it, maybe it's already gone
@@ -312,77 +818,145 @@ async def handle_cookie_banner(page):
 async def get_dropdown_options(page, selector):
     try:
         await page.wait_for_selector(f"{selector} option", timeout=5000)
-    except:
-        pass 
-    options = await page.locator(f"{selector} option").all()
-    results = []
-    for option in options:
-        val = await option.get_attribute("value")
-        label = await option.inner_text()
-        if val: 
-            results.append({"value": val, "label": label.strip()})
-    return results
-
-async def scrape_bark_air(page):
+    except PlaywrightTimeoutError:
+        pass
+    # Read every option in one browser call rather than two per option. Not
+    # memoized: a signature check to see whether the list changed would be a
+    # browser call of its own, the same cost as just reading the options
+    options = await page.locator(f"{selector} option").evaluate_all(
+        "opts => opts.map(o => ({value: o.getAttribute('value'), label: o.innerText}))"
+    )
+    return [
+        {"value": o["value"], "label": o["label"].strip()}
+        for o in options
+        if o["value"]
+    ]
+
+async def _scrape_bark_route(page, origin: str, dest: str, url: str) -> list[Flight]:
+    """Scrape one Bark Air route listing; [] if it has no flights or fails."""
+    print(f"   🔎 Checking Route: {origin} -> {dest}...")
+    
+    flights = []
+    try:
+        # The listing is server-rendered, so the cards are in the HTML
+        # itself; no need to wait for the rest of the page's subresources
+        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        try:
+            # Go as soon as a card is in the DOM; routes with no flights
+            # never get one, so they still cost the old fixed 1.5s
+            await page.wait_for_selector(".flight_box", state="attached", timeout=1500)
+        except PlaywrightTimeoutError:
+            pass
+        
+        # Every card's fields in one round-trip (see JS_EXTRACT_BARK)
+        cards = await page.evaluate(JS_EXTRACT_BARK)
+        if len(cards) == 0: return flights
+        
+        print(f"      ✅ {origin} -> {dest}: found {len(cards)} flights!")
+
+        flights = _bark_cards_to_flights(cards, origin, dest)
+    except Exception as e:
+        # One slow or broken route shouldn't sink the rest; goto's own
+        # timeout bounds how long it can hold this page
+        print(f"      ⚠️ {origin} -> {dest} failed: {str(e)[:100]}")
+    return flights
+
+async def scrape_bark_air(context, routes: list[tuple[str, str, str]] = BARK_ROUTES):
+    """
+    Bark Air through Playwright, BARK_CONCURRENCY pages at a time in the
+    given browser context. main() only calls this for the routes
+    scrape_bark_air_http couldn't fetch, or for all of them if it found
+    nothing at all.
+    """
     print("🐶 Scraping Bark Air (Direct URL Mode)...")
     
-    cities = [
-        "London", "New York", "Los Angeles", "Paris", 
-        "San Francisco", "Madrid", "Seattle", "Honolulu", 
-        "Lisbon", "Kailua-Kona"
-    ]
+    # Every route is an independent GET, so a few pages work through the list
+    # side by side, each taking the next unclaimed route. They share one
+    # context, so Shopify's scripts and styles are cached once for all of them
+    results: list[list[Flight]] = [[] for _ in routes]
+    pending = iter(enumerate(routes))
     
-    all_flights = []
+    async def worker():
+        page = await context.new_page()
+        try:
+            for idx, (origin, dest, url) in pending:
+                results[idx] = await _scrape_bark_route(page, origin, dest, url)
+        finally:
+            await page.close()
     
-    for origin in cities:
-        for dest in cities:
-            if origin == dest: continue 
-            
-            route_slug = f"{origin.replace(' ', '+')}+To+{dest.replace(' ', '+')}"
-            url = f"https://air.bark.co/collections/bookings?filter.v.option.location={route_slug}&sort_by=created-ascending"
-            
-            print(f"   🔎 Checking Route: {origin} -> {dest}...")
-            
-            try:
-                await page.goto(url, timeout=30000)
-                await page.wait_for_timeout(1500)
-                
-                cards = await page.locator(".flight_box").all()
-                if len(cards) == 0: continue
-                
-                print(f"      ✅ Found {len(cards)} flights!")
+    # A worker that dies (e.g. its page won't open) just leaves its
+    # routes to the others instead of failing the whole Bark scrape
+    outcomes = await asyncio.gather(
+        *(worker() for _ in range(min(BARK_CONCURRENCY, len(routes)))),
+        return_exceptions=True,
+    )
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            print(f"   ⚠️ Bark browser worker failed: {str(outcome)[:100]}")
+    
+    # Flatten in route order, as the sequential loop produced them
+    all_flights = [flight for route_flights in results for flight in route_flights]
 
-                for card in cards:
-                    try:
-                        header = card.locator(".flight_details").first 
-                        raw_date = await header.get_attribute("data-flight-date")
-                        if not raw_date: continue
+    print(f"\nFound {len(all_flights)} TOTAL Bark flights.")
+    return all_flights
 
-                        price_el = card.locator(".price-item--regular").first
-                        price_text = await price_el.inner_text() if await price_el.count() > 0 else "0"
-                        
-                        seats_el = card.locator(".flight-availability-info").first
-                        seats_text = await seats_el.inner_text() if await seats_el.count() > 0 else "0"
-                        
-                        is_sold_out = await card.locator(".sold-out-tag").count() > 0
-                        status = "Sold Out" if is_sold_out else "Available"
-                        
-                        all_flights.append({
-                            "competitor": "Bark Air",
-                            "date": raw_date,
-                            "route": f"{origin} -> {dest}", 
-                            "price": clean_price(price_text),
-                            "seats": clean_seats(seats_text),
-                            "status": status,
-                            "operator": "Gulfstream G5"
-                        })
-                    except Exception:
-                        continue
-            except Exception as e:
-                continue
+async def _fetch_bark_route(
+    client: httpx.AsyncClient, origin: str, dest: str, url: str, sem: asyncio.Semaphore
+) -> list[Flight] | None:
+    """GET one Bark Air route listing; [] if it has no flights, None if it fails."""
+    async with sem:
+        try:
+            # Shopify may bounce the listing to a canonical / localized URL;
+            # throttling (429) and 5xx are retried with backoff
+            resp = await _send_with_retry(client, "GET", url, follow_redirects=True)
+        except Exception as e:
+            print(f"      ⚠️ {origin} -> {dest} failed: {str(e)[:100]}")
+            return None
+
+    cards = await asyncio.to_thread(_extract_bark_cards_from_html, resp.text)
+    if cards:
+        print(f"      ✅ {origin} -> {dest}: found {len(cards)} flights!")
+    return _bark_cards_to_flights(cards, origin, dest)
+
+async def scrape_bark_air_http(
+    client: httpx.AsyncClient,
+) -> tuple[list[Flight], list[tuple[str, str, str]]]:
+    """
+    Bark Air without a browser: the route listings are server-rendered
+    Shopify collection pages, so a plain GET returns the same cards.
+    Returns the flights plus the BARK_ROUTES entries that still failed after
+    retries, so main() can send just those through scrape_bark_air.
+    """
+    print("🐶 Scraping Bark Air via direct HTTP...")
+    
+    sem = asyncio.Semaphore(BARK_HTTP_CONCURRENCY)
+    results = await asyncio.gather(
+        *(
+            _fetch_bark_route(client, origin, dest, url, sem)
+            for origin, dest, url in BARK_ROUTES
+        )
+    )
+    
+    # Flatten in route order, as the browser scraper does
+    all_flights = [
+        flight for route_flights in results if route_flights for flight in route_flights
+    ]
+    failed = [route for route, flights in zip(BARK_ROUTES, results) if flights is None]
 
     print(f"\nFound {len(all_flights)} TOTAL Bark flights.")
-    return all_flights
+    if failed:
+        print(f"   ⚠️ {len(failed)} Bark routes failed over HTTP")
+    return all_flights, failed
+
+async def _select_k9_origin(page, origin: dict, timeout_ms: int) -> list[dict]:
+    """Pick an origin in the K9 filter and return the destinations it offers."""
+    await _run_and_wait_for_xhr(
+        page,
+        page.select_option('select[name="pa_departure-location"]', origin['value']),
+        timeout_ms,
+    )
+    destinations = await get_dropdown_options(page, 'select[name="pa_arrival-location"]')
+    return [d for d in destinations if d['value'] and "flying to" not in d['label'].lower()]
 
 async def scrape_k9_jets_ajax(page):
     """
@@ -392,12 +966,12 @@ async def scrape_k9_jets_ajax(page):
     print("   🔄 Strategy 1: AJAX Filter Approach...")
     
     all_flights = []
-    seen_flights = set()
+    seen_flights: set[tuple[str, str]] = set()
     
     try:
         await page.goto("https://www.k9jets.com/routes/", timeout=60000)
         await handle_cookie_banner(page)
-        await page.wait_for_timeout(3000)  # Give AJAX time to initialize
+        await _wait_for_network_idle(page, 3000)  # Give AJAX time to initialize
         
         # Get initial origin options
         origins = await get_dropdown_options(page, 'select[name="pa_departure-location"]')
@@ -410,12 +984,7 @@ async def scrape_k9_jets_ajax(page):
         print(f"      → Found {len(origins)} origins to test")
         
         # Try first origin to see if destinations populate
-        test_origin = origins[0]
-        await page.select_option('select[name="pa_departure-location"]', test_origin['value'])
-        await page.wait_for_timeout(3000)  # Wait for AJAX
-        
-        test_dests = await get_dropdown_options(page, 'select[name="pa_arrival-location"]')
-        test_dests = [d for d in test_dests if d['value'] and "flying to" not in d['label'].lower()]
+        test_dests = await _select_k9_origin(page, origins[0], 3000)
         
         if len(test_dests) == 0:
             print("      ⚠️  AJAX not populating destinations (headless issue)")
@@ -423,75 +992,61 @@ async def scrape_k9_jets_ajax(page):
         
         print(f"      ✅ AJAX working! Found {len(test_dests)} destinations for test origin")
         
+        # The apply button is part of the filter form, so one check covers
+        # every origin and destination. It's the only count() left: the card
+        # fields are read by JS_EXTRACT_K9, which null-checks in the page
+        search_btn = page.locator('.apply-filters__button')
+        if await search_btn.count() == 0:
+            # Cards are only read after applying, so without the button every
+            # origin/destination select below would be wasted waiting
+            print("      ⚠️  No apply-filters button found")
+            return []
+        
         # Full AJAX scrape
         for idx, origin in enumerate(origins):
             try:
-                await page.goto("https://www.k9jets.com/routes/", timeout=60000)
-                await handle_cookie_banner(page)
-                await page.wait_for_timeout(2000)
-                
-                await page.select_option('select[name="pa_departure-location"]', origin['value'])
-                await page.wait_for_timeout(2500)
-                
-                destinations = await get_dropdown_options(page, 'select[name="pa_arrival-location"]')
-                destinations = [d for d in destinations if d['value'] and "flying to" not in d['label'].lower()]
+                if idx == 0:
+                    # The test above already loaded this origin's destinations
+                    destinations = test_dests
+                else:
+                    # Re-filter the page as it is; a fresh load is only worth
+                    # its cost when that fails or leaves no destinations
+                    try:
+                        destinations = await _select_k9_origin(page, origin, 2500)
+                    except Exception:
+                        destinations = []
+                    if not destinations:
+                        await page.goto("https://www.k9jets.com/routes/", timeout=60000)
+                        await handle_cookie_banner(page)
+                        await _wait_for_network_idle(page, 2000)
+                        destinations = await _select_k9_origin(page, origin, 2500)
                 
                 for dest in destinations:
-                    await page.select_option('select[name="pa_arrival-location"]', dest['value'])
-                    await page.wait_for_timeout(500)
+                    await _run_and_wait_for_xhr(
+                        page,
+                        page.select_option('select[name="pa_arrival-location"]', dest['value']),
+                        500,
+                    )
+                    await _run_and_wait_for_xhr(page, search_btn.click(), 3000)
                     
-                    search_btn = page.locator('.apply-filters__button')
-                    if await search_btn.count() > 0:
-                        await search_btn.click()
-                        await page.wait_for_timeout(3000)
-                        
-                        cards = await page.locator("article.elementor-post").all()
-                        if len(cards) > 0:
-                            print(f"      [{idx+1}/{len(origins)}] {origin['label']} → {dest['label']}: {len(cards)} flights")
+                    cards = await page.evaluate(JS_EXTRACT_K9)
+                    if len(cards) > 0:
+                        print(f"      [{idx+1}/{len(origins)}] {origin['label']} → {dest['label']}: {len(cards)} flights")
+                    
+                    for card in cards:
+                        if card["date"] is None: continue
+                        route_text = card["route"] if card["route"] is not None else f"{origin['label']} -> {dest['label']}"
                         
-                        for card in cards:
-                            try:
-                                date_el = card.locator(".elementor-icon-box-title")
-                                if await date_el.count() == 0: continue
-                                raw_date = await date_el.inner_text()
-                                
-                                route_el = card.locator(".elementor-icon-box-description")
-                                route_text = await route_el.inner_text() if await route_el.count() > 0 else f"{origin['label']} -> {dest['label']}"
-                                
-                                flight_key = f"{raw_date}|{route_text}"
-                                if flight_key in seen_flights:
-                                    continue
-                                seen_flights.add(flight_key)
-                                
-                                price_el = card.locator(".woocommerce-Price-amount").first
-                                price_text = await price_el.inner_text() if await price_el.count() > 0 else "0"
-                                
-                                seats_el = card.locator(".stock").first
-                                seats_text = await seats_el.inner_text() if await seats_el.count() > 0 else "0"
-                                
-                                operator_el = card.locator("p.elementor-heading-title")
-                                operator_text = "Unknown"
-                                for i in range(await operator_el.count()):
-                                    text = await operator_el.nth(i).inner_text()
-                                    if "Operator:" in text:
-                                        operator_text = text.replace("Operator:", "").strip()
-                                        break
-                                
-                                all_flights.append({
-                                    "competitor": "K9 Jets",
-                                    "date": raw_date.strip(),
-                                    "route": route_text.strip(),
-                                    "operator": operator_text,
-            "price": clean_price(price_text),
-                                    "seats": clean_seats(seats_text),
-                                    "status": "Available" if clean_seats(seats_text) > 0 else "Sold Out"
-                                })
-                            except:
-                                continue
+                        flight_key = (card["date"], route_text)
+                        if flight_key in seen_flights:
+                            continue
+                        seen_flights.add(flight_key)
                         
-                        await page.goto("https://www.k9jets.com/routes/", timeout=60000)
-                        await page.wait_for_timeout(1000)
-            except:
+                        all_flights.append(_k9_card_to_flight(card, route_text))
+                    # No reload between destinations: the next select_option
+                    # replaces the arrival filter on the page as it is
+            except Exception as e:
+                print(f"      ⚠️  Origin {origin['label']} failed: {str(e)[:100]}")
                 continue
         
         return all_flights
@@ -507,11 +1062,11 @@ async def scrape_k9_jets_fallback(page):
     print("   📜 Strategy 2: Enhanced Scrolling (Fallback)...")
     
     all_flights = []
-    seen_flights = set()
+    seen_flights: set[tuple[str, str]] = set()
     
     await page.goto("https://www.k9jets.com/routes/", timeout=60000)
     await handle_cookie_banner(page)
-    await page.wait_for_timeout(2000)
+    await _wait_for_network_idle(page, 2000)
     
     # Aggressive scrolling
     previous_count = 0
@@ -519,12 +1074,19 @@ async def scrape_k9_jets_fallback(page):
     max_scrolls = 50
     
     for _ in range(max_scrolls):
-        current_count = await page.locator("article.elementor-post").count()
-        
-        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        await page.wait_for_timeout(1500)
+        # Count the cards and scroll in one round-trip to the browser
+        current_count = await _run_and_wait_for_xhr(
+            page, page.evaluate(JS_SCROLL_K9), 1500, predicate=_is_xhr
+        )
         await page.evaluate("window.scrollBy(0, -500)")
-        await page.wait_for_timeout(500)
+        try:
+            # Move on as soon as more cards are in; a stalled page still
+            # gets the old fixed 500ms before it counts as unchanged
+            await page.wait_for_function(
+                JS_K9_MORE_CARDS, arg=current_count, timeout=500
+            )
+        except PlaywrightTimeoutError:
+            pass
         
         if current_count == previous_count:
             no_change_count += 1
@@ -536,67 +1098,29 @@ async def scrape_k9_jets_fallback(page):
         
         previous_count = current_count
     
-    cards = await page.locator("article.elementor-post").all()
+    cards = await page.evaluate(JS_EXTRACT_K9)
     print(f"      → Scraping {len(cards)} visible cards...")
     
     for card in cards:
-        try:
-            date_el = card.locator(".elementor-icon-box-title")
-            if await date_el.count() == 0:
-                continue
-            raw_date = await date_el.inner_text()
-
-            route_el = card.locator(".elementor-icon-box-description")
-            route_text = (
-                await route_el.inner_text()
-                if await route_el.count() > 0
-                else "Unknown Route"
-            )
-
-            flight_key = f"{raw_date}|{route_text}"
-            if flight_key in seen_flights:
-                continue
-            seen_flights.add(flight_key)
-
-            price_el = card.locator(".woocommerce-Price-amount").first
-            price_text = (
-                await price_el.inner_text() if await price_el.count() > 0 else "0"
-            )
-
-            seats_el = card.locator(".stock").first
-            seats_text = (
-                await seats_el.inner_text() if await seats_el.count() > 0 else "0"
-            )
+        if card["date"] is None:
+            continue
+        route_text = card["route"] if card["route"] is not None else "Unknown Route"
 
-            operator_el = card.locator("p.elementor-heading-title")
-            operator_text = "Unknown"
-            for i in range(await operator_el.count()):
-                text = await operator_el.nth(i).inner_text()
-                if "Operator:" in text:
-                    operator_text = text.replace("Operator:", "").strip()
-                    break
-
-            all_flights.append(
-                {
-            "competitor": "K9 Jets",
-            "date": raw_date.strip(),
-                    "route": route_text.strip(),
-                    "operator": operator_text,
-            "price": clean_price(price_text),
-                    "seats": clean_seats(seats_text),
-                    "status": "Available"
-                    if clean_seats(seats_text) > 0
-                    else "Sold Out",
-                }
-            )
-        except:
+        flight_key = (card["date"], route_text)
+        if flight_key in seen_flights:
             continue
+        seen_flights.add(flight_key)
+
+        all_flights.append(_k9_card_to_flight(card, route_text))
     
     return all_flights
 
 async def scrape_k9_jets(page):
     """
     Hybrid K9 Jets scraper: Try AJAX approach first, fall back to scrolling if needed.
+
+    Browser fallback only: main() runs scrape_k9_jets_http first, since the
+    /routes/ listing is server-rendered and plain HTTP gets the same cards.
     """
     print("✈️ Scraping K9 Jets (Hybrid: AJAX + Fallback)...")
     
@@ -615,7 +1139,104 @@ async def scrape_k9_jets(page):
     return fallback_flights
 
 
-async def scrape_k9_jets_http() -> list[dict]:
+async def _fetch_k9_detail_limited(
+    client: httpx.AsyncClient, url: str, sem: asyncio.Semaphore, limiter: _RateLimiter
+) -> dict:
+    """One rate-limited product page fetch (shared by every flight with this URL)."""
+    async with sem:
+        # Paced by the clock rather than a fixed pause after each page, so
+        # slow responses don't also cost a sleep
+        return await _fetch_k9_detail_page(client, url, limiter=limiter)
+
+
+async def _refine_k9_flight(
+    client: httpx.AsyncClient,
+    f: Flight,
+    sem: asyncio.Semaphore,
+    limiter: _RateLimiter,
+    detail_tasks: dict[str, asyncio.Task],
+):
+    """Refine price & seats on one flight from its product page, in place."""
+    url = f["url"]
+    # The same product page shows up under several origin filters; fetch it
+    # once per run and let every flight that links to it await that result
+    task = detail_tasks.get(url)
+    if task is None:
+        task = detail_tasks[url] = asyncio.create_task(
+            _fetch_k9_detail_limited(client, url, sem, limiter)
+        )
+    try:
+        detail = await task
+        if detail.get("price") is not None:
+            f["price"] = detail["price"]
+        if "seats" in detail:
+            f["seats"] = detail["seats"]
+        if "status" in detail:
+            f["status"] = detail["status"]
+    except Exception:
+        # If detail fetch fails, keep the coarse values from /routes/
+        pass
+
+
+async def _scrape_k9_origin(
+    client: httpx.AsyncClient,
+    base_url: str,
+    origin: dict,
+    idx: int,
+    total: int,
+    origin_sem: asyncio.Semaphore,
+    detail_sem: asyncio.Semaphore,
+    limiter: _RateLimiter,
+    detail_tasks: dict[str, asyncio.Task],
+) -> list[Flight]:
+    """POST one origin filter to /routes/ and refine its flights' details."""
+    origin_id = origin["value"]
+    origin_label = origin["label"]
+
+    data = {
+        "jsf": "epro-posts/default",
+        "_tax_query_pa_departure-location": origin_id,
+        "jet-smart-filters-redirect": "1",
+    }
+
+    async with origin_sem:
+        print(f"   📍 [{idx}/{total}] Origin: {origin_label} (id={origin_id})")
+        try:
+            # Same request budget as the product pages
+            resp = await _send_with_retry(
+                client, "POST", f"{base_url}/routes/",
+                limiter=limiter, data=data, headers=K9_HEADERS,
+            )
+        except Exception as e:
+            print(f"      ⚠️ HTTP error for origin {origin_label}: {e}")
+            return []
+
+    flights = await asyncio.to_thread(_extract_k9_flights_from_html, resp.text)
+    print(f"      → Found {len(flights)} flights for origin {origin_label}")
+
+    for f in flights:
+        # Ensure route has a sensible format; if not, prefix origin.
+        route = f.get("route") or "Unknown Route"
+        # Same separators split_route knows, so a decoded "A – B" isn't
+        # mistaken for a bare destination and prefixed into "O -> A – B"
+        if not _has_route_separator(route):
+            # Route is just a city name - assume it's the destination
+            # and add origin as prefix
+            route = f"{origin_label} -> {route}"
+            f["route"] = route
+
+    # If we have a detail URL, refine price & seats from the product page.
+    await asyncio.gather(
+        *(
+            _refine_k9_flight(client, f, detail_sem, limiter, detail_tasks)
+            for f in flights
+            if f.get("url")
+        )
+    )
+    return flights
+
+
+async def scrape_k9_jets_http(client: httpx.AsyncClient) -> list[Flight]:
     """
     HTTP-only K9 Jets scraper that calls the same endpoints as the site,
     avoiding headless / AJAX timing issues.
@@ -627,193 +1248,316 @@ async def scrape_k9_jets_http() -> list[dict]:
             _tax_query_pa_departure-location = <origin_id>
             jet-smart-filters-redirect = 1
          and parse all resulting flight cards.
+
+    The plugin's own XHR (admin-ajax.php?action=jet_smart_filters) would
+    return just the cards as JSON, but it also needs the widget settings
+    the page's JS posts along with it; the redirect POST only needs the
+    filter value, and the card regexes skip the rest of the page anyway.
+
+    All requests go through the shared ``client`` opened in main().
     """
     print("✈️ Scraping K9 Jets via direct HTTP (no headless limitations)...")
 
-    base_url = "https://www.k9jets.com"
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (X11; Linux x86_64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
-        "Referer": f"{base_url}/routes/",
-    }
+    base_url = K9_BASE_URL
 
-    all_flights: list[dict] = []
-    seen_keys: set[str] = set()
+    all_flights: list[Flight] = []
+    seen_keys: set[tuple[str, str]] = set()
 
-    async with httpx.AsyncClient(headers=headers, timeout=30) as client:
+    try:
+        resp = await client.get(f"{base_url}/routes/", headers=K9_HEADERS)
+        resp.raise_for_status()
+    except Exception as e:
+        print(f"   ⚠️ HTTP error loading routes page: {e}")
+        return []
+
+    html = resp.text
+    origins = _extract_select_options(html, "pa_departure-location")
+    # Filter out placeholders like "Flying from..."
+    origins = [
+        o
+        for o in origins
+        if o["value"] and "flying from" not in o["label"].lower()
+    ]
+
+    if not origins:
+        print("   ⚠️ No origin options found in HTML.")
+        return []
+
+    print(f"   → Found {len(origins)} origin options from HTML.")
+
+    # Origins overlap a few at a time; detail pages share one wider limit.
+    # Both draw on one rate limiter, so K9 sees K9_REQUEST_RATE overall
+    origin_sem = asyncio.Semaphore(K9_ORIGIN_CONCURRENCY)
+    detail_sem = asyncio.Semaphore(K9_DETAIL_CONCURRENCY)
+    k9_limiter = _RateLimiter(K9_REQUEST_RATE)
+    detail_tasks: dict[str, asyncio.Task] = {}
+    per_origin = await asyncio.gather(
+        *(
+            _scrape_k9_origin(
+                client, base_url, origin, idx, len(origins),
+                origin_sem, detail_sem, k9_limiter, detail_tasks,
+            )
+            for idx, origin in enumerate(origins, start=1)
+        )
+    )
+
+    # Dedupe in origin order, so the first origin to list a flight wins
+    for flights in per_origin:
+        for f in flights:
+            key = (f["date"], f["route"])
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            all_flights.append(f)
+
+    print(f"   ✅ HTTP K9 scraper collected {len(all_flights)} unique flights.")
+    return all_flights
+
+# Formats the sites actually use, tried with strptime before falling back to
+# dateutil's (much slower) guessing. Only formats dateutil reads the same way
+# belong here - e.g. no day-first "%d/%m/%Y", which it would parse month-first.
+# Bark's ISO data-flight-date hits the first format; with the lru_caches below
+# each distinct string is parsed once a run, so a date.fromisoformat() fast
+# path would save a few microseconds per distinct date and nothing per row.
+_DATE_FORMATS = ("%Y-%m-%d", "%B %d %Y", "%B %d, %Y", "%d %B %Y", "%m/%d/%Y")
+_TIME_FORMATS = ("%I:%M %p", "%H:%M", "%H:%M:%S")
+
+
+def _strptime_any(text: str, formats: tuple[str, ...]) -> datetime:
+    for fmt in formats:
         try:
-            resp = await client.get(f"{base_url}/routes/")
-            resp.raise_for_status()
-        except Exception as e:
-            print(f"   ⚠️ HTTP error loading routes page: {e}")
-            return []
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return parser.parse(text)
+
+
+# Failures come back as None instead of raising so lru_cache keeps them
+# too; otherwise a bad string that repeats on every card goes through
+# dateutil again each time.
+@lru_cache(maxsize=4096)
+def _parse_date(text: str) -> str | None:
+    """Scraped date string -> "YYYY-MM-DD"; None if it can't be parsed."""
+    try:
+        return _strptime_any(text, _DATE_FORMATS).strftime("%Y-%m-%d")
+    except (ValueError, OverflowError):
+        return None
 
-        html = resp.text
-        origins = _extract_select_options(html, "pa_departure-location")
-        # Filter out placeholders like "Flying from..."
-        origins = [
-            o
-            for o in origins
-            if o["value"] and "flying from" not in o["label"].lower()
-        ]
-
-        if not origins:
-            print("   ⚠️ No origin options found in HTML.")
-            return []
 
-        print(f"   → Found {len(origins)} origin options from HTML.")
+@lru_cache(maxsize=4096)
+def _parse_time(text: str) -> str | None:
+    """Scraped time string -> 24h "HH:MM:SS"; None if it can't be parsed."""
+    try:
+        return _strptime_any(text, _TIME_FORMATS).time().strftime("%H:%M:%S")
+    except (ValueError, OverflowError):
+        return None
+
 
-        for idx, origin in enumerate(origins, start=1):
-            origin_id = origin["value"]
-            origin_label = origin["label"]
-            print(f"   📍 [{idx}/{len(origins)}] Origin: {origin_label} (id={origin_id})")
+# (competitor, origin, destination, departure_date): the flights conflict key
+FlightKey = tuple[str, str, str, str]
 
-            data = {
-                "jsf": "epro-posts/default",
-                "_tax_query_pa_departure-location": origin_id,
-                "jet-smart-filters-redirect": "1",
-            }
 
-            try:
-                resp = await client.post(f"{base_url}/routes/", data=data)
-                resp.raise_for_status()
-            except Exception as e:
-                print(f"      ⚠️ HTTP error for origin {origin_label}: {e}")
-                continue
+async def _upsert_flights(db: AsyncClient, payloads: list[dict]) -> list[dict]:
+    """Bulk upsert flight rows; returns the stored rows (with their ids)."""
+    # PostgREST echoes the full rows (returning=representation); pass 3 only
+    # reads the conflict key and id from them
+    res = await db.table("flights").upsert(
+        payloads, on_conflict="competitor,origin,destination,departure_date"
+    ).execute()
+    return res.data or []
 
-            flights = _extract_k9_flights_from_html(resp.text)
-            print(f"      → Found {len(flights)} flights for origin {origin_label}")
-
-            for f in flights:
-                # Ensure route has a sensible format; if not, prefix origin.
-                route = f.get("route") or "Unknown Route"
-                if "->" not in route and " to " not in route.lower() and " - " not in route:
-                    # Route is just a city name - assume it's the destination
-                    # and add origin as prefix
-                    route = f"{origin_label} -> {route}"
-                    f["route"] = route
-
-                # If we have a detail URL, refine price & seats from the product page.
-                url = f.get("url")
-                if url:
-                    try:
-                        detail = await _fetch_k9_detail_page(client, url)
-                        if detail.get("price") is not None:
-                            f["price"] = detail["price"]
-                        if "seats" in detail:
-                            f["seats"] = detail["seats"]
-                        if "status" in detail:
-                            f["status"] = detail["status"]
-                        # Rate limit: small delay between detail page fetches
-                        await asyncio.sleep(0.3)
-                    except Exception:
-                        # If detail fetch fails, keep the coarse values from /routes/
-                        pass
 
-                key = f"{f['date']}|{f['route']}"
-                if key in seen_keys:
-                    continue
-                seen_keys.add(key)
-                all_flights.append(f)
+async def _insert_snapshots(db: AsyncClient, payloads: list[dict]) -> None:
+    """Bulk insert snapshot rows."""
+    # Nothing reads the inserted rows back, so don't have PostgREST echo them
+    await db.table("flight_snapshots").insert(
+        payloads, returning=ReturnMethod.minimal
+    ).execute()
 
-    print(f"   ✅ HTTP K9 scraper collected {len(all_flights)} unique flights.")
-    return all_flights
 
-async def save_to_supabase(data):
+async def save_to_supabase(db: AsyncClient, data: list[Flight]):
+    """
+    Upsert scraped flights and record one price/seats snapshot for each.
+
+    Duplicate (competitor, route, date) rows keep the last one scraped.
+    A snapshot only ever gets the id returned for its own flight key; rows
+    whose flight didn't come back are skipped rather than attached to
+    another flight.
+    """
     print(f"💾 Processing {len(data)} scraped rows...")
     
-    unique_data = {}
-    for item in data:
-        signature = f"{item['competitor']}_{item['route']}_{item['date']}"
-        unique_data[signature] = item
-    
-    clean_data = list(unique_data.values())
-    print(f"   📉 Deduplicated: Removed {len(data) - len(clean_data)} duplicate entries.")
-    print(f"   🚀 Uploading {len(clean_data)} unique snapshots to Supabase in batches...")
-
-    # Process in chunks to avoid timeout
-    BATCH_SIZE = 50
-    total_batches = (len(clean_data) + BATCH_SIZE - 1) // BATCH_SIZE
+    # Tuple keys: cheaper to hash than a formatted string, and a "_" inside a
+    # route can no longer make two different flights collide
+    unique_data: dict[tuple[str, str, str], Flight] = {
+        (item["competitor"], item["route"], item["date"]): item for item in data
+    }
     
-    for batch_num in range(total_batches):
-        start_idx = batch_num * BATCH_SIZE
-        end_idx = min(start_idx + BATCH_SIZE, len(clean_data))
-        batch = clean_data[start_idx:end_idx]
-        
-        print(f"   📦 Processing batch {batch_num + 1}/{total_batches} ({len(batch)} records)...")
-        
-        for item in batch:
-            try:
-                # Parse date (and optional time) from scraped strings
-                dt_obj = parser.parse(str(item.get("date")))
-                clean_date = dt_obj.strftime("%Y-%m-%d")
-            except Exception:
-                # If we can't parse the date, skip this row to avoid bad data
-                print(f"   ⚠️ Skipping flight with unparseable date: {item.get('date')}")
-                continue
+    print(f"   📉 Deduplicated: Removed {len(data) - len(unique_data)} duplicate entries.")
+
+    # --- Pass 1: build one flight payload per conflict key ---
+    flight_payloads: dict[FlightKey, dict] = {}
+    rows: list[tuple[FlightKey, Flight]] = []  # (flight key, scraped item)
+    for item in unique_data.values():
+        # Parse date (and optional time) from scraped strings
+        clean_date = _parse_date(str(item.get("date")))
+        if clean_date is None:
+            # If we can't parse the date, skip this row to avoid bad data
+            print(f"   ⚠️ Skipping flight with unparseable date: {item.get('date')}")
+            continue
 
-            # Optional departure time (K9 only, Bark doesn't provide it)
-            dep_time_str = item.get("departure_time")
-            clean_time = None
-            if dep_time_str:
-                try:
-                    # Normalise to HH:MM:SS (24h) for Postgres TIME column
-                    t = parser.parse(str(dep_time_str)).time()
-                    clean_time = t.strftime("%H:%M:%S")
-                except Exception:
-                    print(f"   ⚠️ Could not parse departure_time '{dep_time_str}'")
-                    clean_time = None
-
-            # --- Parse origin / destination from the route string ---
+        # Optional departure time (K9 only, Bark doesn't provide it)
+        dep_time_str = item.get("departure_time")
+        clean_time = None
+        if dep_time_str:
+            # Normalise to HH:MM:SS (24h) for Postgres TIME column
+            clean_time = _parse_time(str(dep_time_str))
+            if clean_time is None:
+                print(f"   ⚠️ Could not parse departure_time '{dep_time_str}'")
+
+        # --- Origin / destination: as scraped, else parsed from the route ---
+        if "origin" in item:
+            origin, destination = item["origin"], item["destination"]
+        else:
             origin, destination = split_route(item.get("route", ""))
 
-            flight_payload = {
-                "competitor": item["competitor"],
-                "origin": origin,
-                "destination": destination,
-                "departure_date": clean_date,
-                "departure_time": clean_time,
-                "operator": item.get("operator"),
-            }
-            
-            res = supabase.table("flights").upsert(
-                flight_payload, on_conflict="competitor,origin,destination,departure_date"
-            ).execute()
-            
-            if res.data:
-                flight_id = res.data[0]["id"]
-            seats_val = item.get("seats")
-            status_val = item.get("status", "Available")
-
-            # For K9, we explicitly interpret "no numeric seats" as Sold Out.
-            if item.get("competitor") == "K9 Jets" and seats_val is None:
-                status_val = "Sold Out"
-
-            snapshot_payload = {
-                "flight_id": flight_id,
-                "price": item.get("price"),
-                "seats_available": seats_val,
-                "status": status_val,
-            }
-            supabase.table("flight_snapshots").insert(snapshot_payload).execute()
+        key = (item["competitor"], origin, destination, clean_date)
+        # A bulk upsert can't touch the same row twice, so routes that split
+        # to the same key collapse here - last one wins, as with row-by-row.
+        flight_payloads[key] = {
+            "competitor": item["competitor"],
+            "origin": origin,
+            "destination": destination,
+            "departure_date": clean_date,
+            "departure_time": clean_time,
+            "operator": item.get("operator"),
+        }
+        rows.append((key, item))
+
+    # --- Pass 2: one upsert per chunk, then map the returned ids back ---
+    # Flights already in the table are upserted too: the upsert is also how
+    # we learn their ids (skipping it would just trade it for a select of
+    # the same size), and it refreshes operator / departure_time. With
+    # BATCH_SIZE rows per request that's only a request or two per run.
+    payload_list = list(flight_payloads.values())
+    print(f"   🚀 Upserting {len(payload_list)} flights to Supabase...")
+    id_by_key: dict[FlightKey, int] = {}
+    # Chunks hold disjoint conflict keys, so they can be in flight together
+    upserted = await asyncio.gather(
+        *(
+            _upsert_flights(db, payload_list[start:start + BATCH_SIZE])
+            for start in range(0, len(payload_list), BATCH_SIZE)
+        )
+    )
+    # Matched by conflict key rather than zipped by position: nothing
+    # promises the rows come back in the order they were sent
+    for stored_rows in upserted:
+        for row in stored_rows:
+            id_by_key[
+                (row["competitor"], row["origin"], row["destination"], row["departure_date"])
+            ] = row["id"]
+
+    # --- Pass 3: snapshots for every row whose flight came back ---
+    # This has to wait for pass 2's ids. Folding both into one request would
+    # take a Postgres function (called via db.rpc) that isn't in the schema;
+    # as it stands that's one extra round-trip per run, not per row.
+    snapshot_payloads = []
+    for key, item in rows:
+        flight_id = id_by_key.get(key)
+        if flight_id is None:
+            print(f"   ⚠️ No flight id returned for {key}; skipping snapshot")
+            continue
+
+        seats_val = item.get("seats")
+        status_val = item.get("status", "Available")
+
+        # For K9, we explicitly interpret "no numeric seats" as Sold Out.
+        if item.get("competitor") == "K9 Jets" and seats_val is None:
+            status_val = "Sold Out"
+
+        snapshot_payloads.append({
+            "flight_id": flight_id,
+            "price": item.get("price"),
+            "seats_available": seats_val,
+            "status": status_val,
+        })
+
+    print(f"   🚀 Inserting {len(snapshot_payloads)} snapshots to Supabase...")
+    # Plain inserts with nothing to conflict on, so every chunk goes at once
+    await asyncio.gather(
+        *(
+            _insert_snapshots(db, snapshot_payloads[start:start + BATCH_SIZE])
+            for start in range(0, len(snapshot_payloads), BATCH_SIZE)
+        )
+    )
     
-    print(f"   ✅ Successfully uploaded all {len(clean_data)} records!")
+    print(f"   ✅ Successfully uploaded all {len(snapshot_payloads)} records!")
 
 async def main():
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+    async with httpx.AsyncClient(
+        http2=True, headers=DEFAULT_HEADERS, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT
+    ) as client, async_playwright() as p:
+        async def launch_browser():
+            browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+            # One context for both fallbacks, so they share its HTTP cache. The
+            # filter goes on the context: it is in place before any page's
+            # first request and covers anything a page opens
+            context = await browser.new_context()
+            await context.route("**/*", _block_heavy_resources)
+            # Navigations pass their own timeouts; this caps the clicks and
+            # selects, so a stuck filter fails in 15s rather than 30s
+            context.set_default_timeout(15000)
+            return browser, context
+        
+        # Chromium only starts if an HTTP scraper comes back empty; both
+        # fallbacks share the one launch
+        browser_launch: asyncio.Task | None = None
+        
+        def get_browser() -> asyncio.Task:
+            nonlocal browser_launch
+            if browser_launch is None:
+                browser_launch = asyncio.create_task(launch_browser())
+            return browser_launch
+        
+        db = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+        
+        async def bark():
+            # Prefer plain HTTP for Bark too; the browser is the fallback
+            bark_data, failed_routes = await scrape_bark_air_http(client)
+            if not bark_data:
+                # Nothing at all came back: retry every route in the browser
+                failed_routes = BARK_ROUTES
+            if failed_routes:
+                # Routes that errored over HTTP would otherwise go missing
+                # from the run without anything failing
+                _, context = await get_browser()
+                bark_data += await scrape_bark_air(context, failed_routes)
+            await save_to_supabase(db, bark_data)
         
-        bark_data = await scrape_bark_air(page)
-        # Prefer HTTP-based K9 scraper; fall back to Playwright hybrid if needed.
-        k9_http_data = await scrape_k9_jets_http()
-        k9_data = k9_http_data or await scrape_k9_jets(page)
+        async def k9():
+            # Prefer HTTP-based K9 scraper; fall back to Playwright hybrid if needed.
+            k9_data = await scrape_k9_jets_http(client)
+            if not k9_data:
+                _, context = await get_browser()
+                k9_data = await scrape_k9_jets(await context.new_page())
+            await save_to_supabase(db, k9_data)
         
-        await save_to_supabase(bark_data + k9_data)
-        await browser.close()
+        # Flight keys include the competitor, so neither save can touch the
+        # other's rows: each competitor uploads as soon as its own scrape is
+        # done, while the other one is still scraping. Streaming rows any
+        # earlier wouldn't be safe - until a competitor's scrape finishes, a
+        # later duplicate can still replace a row that was already sent.
+        # return_exceptions keeps one competitor's failure from cancelling the
+        # other mid-save; the first failure is re-raised once both are done
+        results = await asyncio.gather(bark(), k9(), return_exceptions=True)
+        failures = [r for r in results if isinstance(r, BaseException)]
+        for name, result in zip(("Bark Air", "K9 Jets"), results):
+            if isinstance(result, BaseException):
+                print(f"❌ {name} failed: {result!r}")
+        if browser_launch is not None:
+            browser, _ = await browser_launch
+            await browser.close()
+        if failures:
+            raise failures[0]
 
 
 if __name__ == "__main__":
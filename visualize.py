@@ -1,3 +1,4 @@
+import io
 import os
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -12,21 +13,45 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Days-out axis every curve is reindexed onto (built once, shared by all)
+DAYS_OUT = np.arange(0, 101)
+
+def fetch_table(table, columns):
+    """Reads columns of a table as CSV straight into a DataFrame
+
+    pandas' C parser builds the typed columns directly, instead of boxing a
+    list of JSON dicts into object columns first.
+    """
+    text = supabase.table(table).select(columns).csv().execute().data
+    if not text:
+        return pd.DataFrame()
+    return pd.read_csv(io.StringIO(text))
+
 def fetch_data():
-    """Fetches ALL snapshots for every future flight to track sales over time"""
+    """Fetches ALL snapshots for every future flight to track sales over time
+
+    Every snapshot is needed, not just each flight's latest: the curves plot
+    seats and price against days out, one point per scrape.
+    """
     print("Fetching full history from Supabase...")
     
-    flights = supabase.table("flights").select("*").execute().data
-    snapshots = supabase.table("flight_snapshots").select("*").execute().data
+    # Only the columns the plots use
+    df_f = fetch_table("flights", "id,competitor,departure_date")
+    df_s = fetch_table("flight_snapshots", "flight_id,scraped_at,price,seats_available")
     
-    if not flights or not snapshots:
+    if df_f.empty or df_s.empty:
         return pd.DataFrame()
-
-    df_f = pd.DataFrame(flights)
-    df_s = pd.DataFrame(snapshots)
     
     # Merge on flight_id
     df = pd.merge(df_s, df_f, left_on="flight_id", right_on="id")
+    # Only two competitors: the per-plot filters compare category codes
+    # instead of every row's string
+    df['competitor'] = df['competitor'].astype('category')
+    
+    # Calculate "Days Out" once here, for both plots
+    df['departure_date'] = pd.to_datetime(df['departure_date']).dt.tz_localize(None)
+    df['scraped_at'] = pd.to_datetime(df['scraped_at']).dt.tz_localize(None)
+    df['days_out'] = (df['departure_date'] - df['scraped_at']).dt.days
     
     return df
 
@@ -36,11 +61,6 @@ def plot_booking_curve(df):
     Includes: Sell-Out Risk and Confidence Intervals
     """
     
-    # Calculate "Days Out"
-    df['departure_date'] = pd.to_datetime(df['departure_date']).dt.tz_localize(None)
-    df['scraped_at'] = pd.to_datetime(df['scraped_at']).dt.tz_localize(None)
-    df['days_out'] = (df['departure_date'] - df['scraped_at']).dt.days
-    
     # Filter 0-100 days
     df = df[(df['days_out'] >= 0) & (df['days_out'] <= 100)].copy()
 
@@ -64,19 +84,26 @@ def plot_booking_curve(df):
             ax.text(0.5, 0.5, f"No data for {name}", transform=ax.transAxes, ha='center')
             continue
 
-        grouped = comp_df.groupby('days_out')['seats_available']
+        # Unsorted groups: every curve is reindexed onto DAYS_OUT anyway
+        grouped = comp_df.groupby('days_out', sort=False)['seats_available']
         
         # 1. Average Seats
-        daily_avg = grouped.mean().reindex(np.arange(0, 101))
+        daily_avg = grouped.mean().reindex(DAYS_OUT)
+        # rolling() skips the NaN days with no scrapes (min_periods=1); on a
+        # 101-point curve that matters far more than its per-call overhead
         trend_curve = daily_avg.rolling(window=14, min_periods=1, center=True).mean()
         
         # 2. Sell-Out Percentage
-        sell_out_series = grouped.apply(lambda x: (x == 0).mean() * 100).reindex(np.arange(0, 101))
+        # One vectorized groupby mean instead of a Python lambda per day
+        sell_out_series = (
+            comp_df['seats_available'].eq(0).groupby(comp_df['days_out'], sort=False).mean() * 100
+        ).reindex(DAYS_OUT)
         sell_out_trend = sell_out_series.rolling(window=14, min_periods=1, center=True).mean()
 
-        # 3. Variability
-        p25 = grouped.quantile(0.25).reindex(np.arange(0, 101)).rolling(window=14, min_periods=1).mean()
-        p75 = grouped.quantile(0.75).reindex(np.arange(0, 101)).rolling(window=14, min_periods=1).mean()
+        # 3. Variability (both quartiles from one pass over the groups)
+        quartiles = grouped.quantile([0.25, 0.75]).unstack().reindex(DAYS_OUT)
+        p25 = quartiles[0.25].rolling(window=14, min_periods=1).mean()
+        p75 = quartiles[0.75].rolling(window=14, min_periods=1).mean()
 
         # Plotting
         ax.fill_between(trend_curve.index, p25, p75, color=color, alpha=0.1, label='Typical Range')
@@ -102,7 +129,7 @@ def plot_booking_curve(df):
 
     axes[1].set_xlabel("Days Until Departure", fontsize=12)
     plt.tight_layout()
-    plt.savefig("booking_curve_risk.png", dpi=300)
+    plt.savefig("booking_curve_risk.png", dpi=150, bbox_inches='tight')
     print(f"Graph generated! Check 'booking_curve_risk.png'")
     plt.show()
 
@@ -113,11 +140,6 @@ def plot_pricing_index(df):
     """
     price_col = 'price' 
 
-    if 'days_out' not in df.columns:
-        df['departure_date'] = pd.to_datetime(df['departure_date']).dt.tz_localize(None)
-        df['scraped_at'] = pd.to_datetime(df['scraped_at']).dt.tz_localize(None)
-        df['days_out'] = (df['departure_date'] - df['scraped_at']).dt.days
-    
     df = df[(df['days_out'] >= 0) & (df['days_out'] <= 100)].copy()
 
     if price_col not in df.columns:
@@ -126,7 +148,8 @@ def plot_pricing_index(df):
 
     # --- THE FIX: NORMALIZE PER FLIGHT FIRST ---
     # 1. Calculate the mean price for EACH individual flight
-    df['flight_mean_price'] = df.groupby('flight_id')[price_col].transform('mean')
+    means = df.groupby('flight_id', sort=False)[price_col].mean().rename('flight_mean_price')
+    df = df.join(means, on='flight_id')
     
     # 2. Create an index: 100 = The average price for that specific flight
     # If index > 100, price is higher than usual. If < 100, it's discounted.
@@ -148,14 +171,14 @@ def plot_pricing_index(df):
             continue
 
         # --- PREPARE DATA ---
-        grouped = comp_df.groupby('days_out')
+        grouped = comp_df.groupby('days_out', sort=False)
         
         # Average the INDEX, not the raw price
-        daily_index = grouped['price_index'].mean().reindex(np.arange(0, 101))
+        daily_index = grouped['price_index'].mean().reindex(DAYS_OUT)
         index_trend = daily_index.rolling(window=14, min_periods=1, center=True).mean()
 
         # Seat context (for reference)
-        daily_seats = grouped['seats_available'].mean().reindex(np.arange(0, 101))
+        daily_seats = grouped['seats_available'].mean().reindex(DAYS_OUT)
         seat_trend = daily_seats.rolling(window=14, min_periods=1, center=True).mean()
 
         # --- PLOTTING ---
@@ -205,7 +228,7 @@ def plot_pricing_index(df):
     plt.tight_layout()
     
     filename = "pricing_strategy_normalized.png"
-    plt.savefig(filename, dpi=300)
+    plt.savefig(filename, dpi=150, bbox_inches='tight')
     print(f"Graph generated! Check '{filename}'")
     plt.show()
 